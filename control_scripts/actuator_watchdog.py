@@ -1,11 +1,39 @@
 #!/usr/bin/env python3
+"""
+Resident actuator watchdog for when the web app is not running (the web app
+runs the same ActuatorWatchdog in-process and owns the Pico ports).
 
-from datetime import datetime, timedelta
-import subprocess
+Commands sent from other processes are picked up from the actuator log the
+moment they are written, and the timer is armed from the time in the log,
+so a late pick-up does not lengthen the movement. The roof is also stopped
+when its end stop closes.
+
+    $ python control_scripts/actuator_watchdog.py
+"""
+
+from datetime import datetime
 import os
+import sys
+import time
+
+WEBSITE_CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "website_code")
+sys.path.insert(0, WEBSITE_CODE)
+
+from get_pico_states import load_gpios_yaml  # noqa: E402
+from utils_actuator_watchdog import ActuatorWatchdog  # noqa: E402
+from utils_picos import ACTUATOR_LOG, add_switch_listener  # noqa: E402
+
+LOG_PATH = ACTUATOR_LOG
+LOG_CHECK_INTERVAL = 0.2  # seconds
+
 
-LOG_PATH = "/home/ingo/WHOPA/actuator_log.txt"
-TIMEOUT_SECONDS = 30
+def parse_log_line(line):
+    """'2025-06-01T21:03:12.123 extend' -> (unix time, 'extend'), or None."""
+    try:
+        timestamp_str, action = line.strip().rsplit(" ", 1)
+        return datetime.fromisoformat(timestamp_str).timestamp(), action
+    except ValueError:
+        return None
 
 
 def read_last_line(filepath):
@@ -19,32 +47,42 @@ def read_last_line(filepath):
         return f.readline().decode().strip()
 
 
-def last_actuator_time():
-    if not os.path.exists(LOG_PATH):
-        return None, None
-    last = read_last_line(LOG_PATH)
-    timestamp_str, action = last.rsplit(" ", 1)
-    timestamp = datetime.fromisoformat(timestamp_str)
-    return timestamp, action
-
-
-def stop_actuator():
-    print("🛑 Timeout reached — sending OFF to actuator")
-    subprocess.run([
-        "/home/ingo/.pyenv/shims/mpremote", "connect", "/dev/ttyACM1",
-        "exec", "device='Actuator'; action='off'; exec(open('pico_switches_action.py').read())"
-    ])
-    with open(LOG_PATH, "a") as f:
-        f.write(f"{datetime.now().isoformat()} off\n")
+def follow_log(watchdog, path=LOG_PATH):
+    """Feeds every new actuator log line to the watchdog."""
+    position = os.path.getsize(path) if os.path.exists(path) else 0
+    partial = ""
+    while True:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        if size < position:
+            position = 0  # log was rotated / truncated
+        if size > position:
+            with open(path) as f:
+                f.seek(position)
+                partial += f.read()
+                position = f.tell()
+            *lines, partial = partial.split("\n")
+            for line in lines:
+                entry = parse_log_line(line)
+                if entry is not None:
+                    watchdog.notify("Actuator", entry[1], since=entry[0])
+        time.sleep(LOG_CHECK_INTERVAL)
 
 
 def main():
-    last_time, last_action = last_actuator_time()
-    if not last_time or last_action not in ["extend", "retract"]:
-        return  # Nothing to stop
+    watchdog = ActuatorWatchdog(load_gpios_yaml(os.path.join(WEBSITE_CODE, "gpios.yaml")))
+    add_switch_listener(watchdog.notify)  # our own "off" commands
+    watchdog.start()
+
+    # A movement started before we came up is armed from its log time (and stopped right away if overdue)
+    if os.path.exists(LOG_PATH):
+        entry = parse_log_line(read_last_line(LOG_PATH))
+        if entry is not None and entry[1] in ["extend", "retract"]:
+            watchdog.notify("Actuator", entry[1], since=entry[0])
 
-    if datetime.now() - last_time > timedelta(seconds=TIMEOUT_SECONDS):
-        stop_actuator()
+    follow_log(watchdog)
 
 
 if __name__ == "__main__":
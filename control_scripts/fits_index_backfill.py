@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Builds (or completes) the FITS header index of the whole archive using all
+CPU cores. Meant for the first index build of a large archive; afterwards
+the syncs keep the index up to date with FitsHeaderIndex.update().
+
+A producer thread walks the archive while a process pool reads the header
+blocks (memory-mapped) in chunks, so traversal, parsing and the SQLite
+writes overlap. Rows are committed every --checkpoint files: an
+interrupted run (Ctrl-C) keeps everything committed so far and the next
+run skips those files, as their size and mtime are already in the index.
+
+    $ python control_scripts/fits_index_backfill.py --workers 4
+"""
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import os
+import queue
+import sys
+import threading
+import time
+
+WEBSITE_CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "website_code")
+sys.path.insert(0, WEBSITE_CODE)
+
+from utils_fits_index import FITS_INDEX_DB, FitsHeaderIndex, header_rows, iter_fits_files  # noqa: E402
+from utils_sync_files import ARCHIVE_PATH  # noqa: E402
+
+CHUNK_SIZE = 64  # files per worker task
+CHECKPOINT_EVERY = 2000  # files between commits
+REPORT_INTERVAL = 5  # seconds between progress lines
+
+
+def produce_chunks(root, known, chunks, seen, chunk_size):
+    """Walks ``root`` and queues chunks of files that are not in the index yet (None when done)."""
+    chunk = []
+    try:
+        for rel_path, size, mtime in iter_fits_files(root):
+            seen.add(rel_path)
+            if known.get(rel_path) == (size, mtime):
+                continue
+            chunk.append((rel_path, size, mtime))
+            if len(chunk) >= chunk_size:
+                chunks.put(chunk)
+                chunk = []
+        if chunk:
+            chunks.put(chunk)
+    finally:
+        chunks.put(None)
+
+
+def backfill(root=ARCHIVE_PATH, db=FITS_INDEX_DB, workers=None, chunk_size=CHUNK_SIZE,
+             checkpoint_every=CHECKPOINT_EVERY):
+    index = FitsHeaderIndex(root, db)
+    known = index.known()
+    workers = workers or os.cpu_count() or 1
+    print(f"🗂️  {len(known)} files already indexed, scanning {root} with {workers} workers")
+
+    chunks = queue.Queue(maxsize=workers * 4)  # bounded, so traversal stays just ahead of the workers
+    seen = set()
+    producer = threading.Thread(target=produce_chunks, args=(root, known, chunks, seen, chunk_size),
+                                name="fits-backfill-walk", daemon=True)
+    producer.start()
+
+    start = last_report = time.time()
+    done = 0
+    pending_rows = []
+    in_flight = set()
+    walked = False
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while not walked or in_flight:
+                # Keep every worker busy, with one chunk queued behind each
+                while not walked and len(in_flight) < workers * 2:
+                    try:
+                        chunk = chunks.get(timeout=0.1 if in_flight else None)
+                    except queue.Empty:
+                        break
+                    if chunk is None:
+                        walked = True
+                    else:
+                        in_flight.add(pool.submit(header_rows, root, chunk))
+                if not in_flight:
+                    continue
+
+                finished, in_flight = wait(in_flight, timeout=1, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rows = future.result()
+                    pending_rows.extend(rows)
+                    done += len(rows)
+                if len(pending_rows) >= checkpoint_every:
+                    index.add(pending_rows)
+                    pending_rows = []
+
+                now = time.time()
+                if now - last_report >= REPORT_INTERVAL:
+                    print(f"⏳ {done} headers read, {len(seen)} files found, "
+                          f"{done / (now - start):.0f} files/s")
+                    last_report = now
+    except KeyboardInterrupt:
+        print("🛑 Interrupted, saving progress")
+        walked = False
+    finally:
+        index.add(pending_rows)
+
+    elapsed = time.time() - start
+    print(f"✅ {done} headers indexed in {elapsed:.0f} s ({done / max(elapsed, 1e-6):.0f} files/s)")
+
+    if walked:
+        removed = set(known) - seen
+        index.remove(removed)
+        if removed:
+            print(f"🗑️  {len(removed)} files no longer in the archive removed from the index")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--root", default=ARCHIVE_PATH, help="archive to index")
+    parser.add_argument("--db", default=FITS_INDEX_DB, help="index database")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="files per worker task")
+    parser.add_argument("--checkpoint", type=int, default=CHECKPOINT_EVERY, help="files between commits")
+    args = parser.parse_args()
+    backfill(args.root, args.db, args.workers, args.chunk, args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from machine import Pin, ADC
 # Try to get sensor filter keyword
 try:
     selected_sensor = sensor.lower()
-except NameError:
+except (NameError, AttributeError):  # not defined, or sensor=None
     selected_sensor = None
 
 result = {}
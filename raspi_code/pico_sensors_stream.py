@@ -0,0 +1,96 @@
+# pico_sensors_stream.py
+#
+# Resident version of pico_sensors_status.py: the peripherals are initialised
+# once and one framed record is printed per sample until interrupted (Ctrl-C):
+#
+#   $S,seq=12,ms=34567,ball=1,bump1=0,bump2=0,rain=40211,accel_x=..,temp=21,hum=48*5A
+#
+# The checksum after "*" is the XOR of all characters between "$" and "*"
+# (as in NMEA), so the host can drop frames garbled on the USB link. The
+# sample rate is taken from the "rate" variable (Hz) if it is defined.
+
+from machine import Pin, ADC, I2C
+import time
+
+try:
+    period_ms = int(1000 / rate)
+except NameError:
+    period_ms = 200
+
+DHT_PERIOD_MS = 2000  # The DHT11 cannot be sampled much faster than 1 Hz
+
+
+# --- Minimal MPU6050 class ---
+class MPU6050:
+    def __init__(self, i2c, addr=0x68):
+        self.i2c = i2c
+        self.addr = addr
+        self.i2c.writeto_mem(self.addr, 0x6B, b'\x00')  # wake up
+
+    def get_values(self):
+        data = self.i2c.readfrom_mem(self.addr, 0x3B, 6)
+        def convert(h, l): return (h << 8 | l) if h < 128 else -((~(h << 8 | l) + 1) & 0xFFFF)
+        return convert(data[0], data[1]), convert(data[2], data[3]), convert(data[4], data[5])
+
+
+# --- One-off initialisation ---
+bump1_pin = Pin(12, Pin.IN, Pin.PULL_UP)
+bump2_pin = Pin(14, Pin.IN, Pin.PULL_UP)
+ball_pin = Pin(15, Pin.IN, Pin.PULL_UP)
+rain_adc = ADC(Pin(28))
+
+try:
+    imu = MPU6050(I2C(1, scl=Pin(27), sda=Pin(26), freq=400_000))
+except Exception:
+    imu = None
+
+try:
+    import dht
+    dht_sensor = dht.DHT11(Pin(29))
+except Exception:
+    dht_sensor = None
+
+
+def checksum(text):
+    c = 0
+    for ch in text:
+        c ^= ord(ch)
+    return c
+
+
+# --- Sample loop ---
+temp = hum = "NA"
+last_dht = time.ticks_add(time.ticks_ms(), -DHT_PERIOD_MS)
+next_tick = time.ticks_ms()
+seq = 0
+
+while True:
+    now = time.ticks_ms()
+
+    if dht_sensor is not None and time.ticks_diff(now, last_dht) >= DHT_PERIOD_MS:
+        last_dht = now
+        try:
+            dht_sensor.measure()
+            temp, hum = dht_sensor.temperature(), dht_sensor.humidity()
+        except Exception:
+            temp = hum = "NA"
+
+    accel = ("NA", "NA", "NA")
+    if imu is not None:
+        try:
+            accel = imu.get_values()
+        except Exception:
+            pass
+
+    body = "S,seq=%d,ms=%d,ball=%d,bump1=%d,bump2=%d,rain=%d,accel_x=%s,accel_y=%s,accel_z=%s,temp=%s,hum=%s" % (
+        seq, now, ball_pin.value(), bump1_pin.value(), bump2_pin.value(),
+        rain_adc.read_u16(), accel[0], accel[1], accel[2], temp, hum)
+    print("$%s*%02X" % (body, checksum(body)))
+    seq += 1
+
+    next_tick = time.ticks_add(next_tick, period_ms)
+    delay = time.ticks_diff(next_tick, time.ticks_ms())
+    if delay > 0:
+        time.sleep_ms(delay)
+    else:
+        next_tick = time.ticks_ms()  # fell behind, don't try to catch up
@@ -1,66 +1,107 @@
 import io
 import os
+import json
+import threading
 import base64
+import unicodedata
+from urllib.parse import quote
 from datetime import datetime
-import matplotlib.pyplot as plt
-import zipfile
+import matplotlib
+matplotlib.use("Agg")  # before any pyplot import: the visibility and wind plots render in request / background threads
 from pathlib import Path
-from flask import Flask, request, render_template, url_for, flash, send_file, send_from_directory, redirect
+from flask import Flask, Response, request, render_template, url_for, flash, send_from_directory, redirect, jsonify
+from werkzeug.utils import safe_join
 
-from plot_wind_from_bom import plot_vic_wind_data_with_quivers
+from utils_wind_map import WindMapCache
+from utils_wind_history import get_wind_history
 from plot_object_visibility import plot_altitude_for_seasons
 
-from get_pico_states import get_sensor_data, get_gpio_states, get_roof_state, get_linux_temperatures, load_gpios_yaml
+from get_pico_states import StatePoller, load_gpios_yaml
 
 from utils_astro import get_sun_moon_altitudes
-from utils_picos import set_switch_device_action, compute_tilt_angle
-from utils_archive_data_access import build_file_tree  # import the helper
+from utils_target_ranking import get_tonights_targets
+from utils_picos import set_switch_device_action, compute_tilt_angle, add_switch_listener
+from utils_actuator_watchdog import ActuatorWatchdog
+from utils_sensor_history import SensorHistory, SENSOR_HISTORY_DB
+from utils_weather_safety import SafetyEngine
+from utils_archive_data_access import ARCHIVE_SCAN_INTERVAL, get_archive_index, stream_zip
+from utils_fits_index import FITS_EXTENSIONS, get_fits_index
 from utils_seestar_data_access import sync_fits_files_to_local, crawl_seestar  # Adjust import paths
 from utils_system import start_script_if_not_running
 
 
 ARCHIVE_PATH = "/media/ingo/archive"
+ARCHIVE_MAX_AGE = 3600  # seconds browsers may reuse an archive file before revalidating its ETag
+FITS_MIMETYPE = "application/fits"
 CTL_SCRIPTS_PATH = Path(__file__).parent.parent / "control_scripts/"
 
+DASHBOARD_TARGETS = 10  # rows in the "best targets tonight" table
+SENSOR_POLL_INTERVAL = 1.0  # seconds
+SENSOR_STREAM_RATE = 5  # Hz, set to None to query the sensor Pico on every poll instead
+
 # Load GPIO setup
 gpios_config = load_gpios_yaml()
 
+# Samples the Picos in the background, started lazily on the first request
+state_poller = StatePoller(interval=SENSOR_POLL_INTERVAL, stream_rate=SENSOR_STREAM_RATE)
+
+# Every sample is kept in the sensor history store
+sensor_history = SensorHistory(SENSOR_HISTORY_DB)
+state_poller.add_listener(sensor_history.record_snapshot)
+
+# Switches actuator, lights and fan off after their drive_time (or at the end stops)
+actuator_watchdog = ActuatorWatchdog(gpios_config)
+add_switch_listener(actuator_watchdog.notify)
+
+# Closes the roof when the weather turns, started by init_background_services() so it runs without page visits
+safety_engine = SafetyEngine(stream_rate=SENSOR_STREAM_RATE)
+
+# Rendered in the background whenever BoM publishes new observations
+wind_map_cache = WindMapCache()
+
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # Needed for flashing messages
 
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def init_background_services():
+    """Starts the safety engine and the wind-map refresher, once per process."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    safety_engine.start()
+    wind_map_cache.start()  # keeps the wind history current for the safety engine
+
+def tonights_targets_or_empty(limit):
+    """get_tonights_targets(limit), or [] if the ranking fails (ephemeris / catalogue errors), so pages still render."""
+    try:
+        return get_tonights_targets(limit=max(limit, 1))
+    except Exception as e:
+        print("❌ Error ranking tonight's targets:", e)
+        return []
+
+
 @app.route("/", methods=["GET", "POST"])
 def dashboard():
     celestial = get_sun_moon_altitudes()
     return render_template("dashboard.html",
                            celestial=celestial,
+                           tonight_targets=tonights_targets_or_empty(DASHBOARD_TARGETS),
                            radar_timestamp=int(datetime.utcnow().timestamp()))
 
 
-@app.route("/observatory", methods=["GET", "POST"])
-def observatory_page():
-    sensor_data = get_sensor_data()
-    gpio_states = get_gpio_states()
-    roof_state = get_roof_state(sensor_data, gpio_states)
-    linux_temperatures = get_linux_temperatures()
-
-    def round_floats(obj):
-        if isinstance(obj, dict):
-            return {k: round_floats(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [round_floats(item) for item in obj]
-        elif isinstance(obj, float):
-            return round(obj, 2)
-        else:
-            return obj
-
-    sensor_data = round_floats(sensor_data)
+@app.route("/api/targets/tonight")
+def tonight_targets():
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(tonights_targets_or_empty(limit))
 
-    gyro_data = sensor_data.get("GY-521", {})
-    x = float(gyro_data.get("Accel_x", 0))
-    y = float(gyro_data.get("Accel_y", 0))
-    z = float(gyro_data.get("Accel_z", 1))
-    tilt_angle = round(compute_tilt_angle(x, y, z))
 
+@app.route("/observatory", methods=["GET", "POST"])
+def observatory_page():
     if request.method == "POST":
         # e.g., "Actuator_extend", "Lights_off"
         action = request.form.get("action")
@@ -72,16 +113,113 @@ def observatory_page():
                 flash(f"✅ Command sent: {device} → {act}")
             except Exception as e:
                 flash(f"❌ Failed to send command: {e}")
+            # Show the effect of the command straight away
+            state_poller.poll_once()
         else:
             flash("⚠️ No action received.")
 
+    state = build_observatory_state(state_poller.snapshot())
+
     return render_template("observatory.html",
                            gpios=gpios_config,
-                           sensors=sensor_data,
-                           gpio_states=gpio_states,
-                           roof_state=roof_state,
-                           tilt_angle=tilt_angle,
-                           linux_temperatures=linux_temperatures)
+                           sensors=state["sensors"],
+                           gpio_states=state["gpio_states"],
+                           roof_state=state["roof_state"],
+                           tilt_angle=state["tilt_angle"],
+                           linux_temperatures=state["linux_temperatures"],
+                           snapshot_age=state["age"],
+                           snapshot_timestamp=state["timestamp"])
+
+
+def round_floats(obj):
+    if isinstance(obj, dict):
+        return {k: round_floats(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [round_floats(item) for item in obj]
+    elif isinstance(obj, float):
+        return round(obj, 2)
+    else:
+        return obj
+
+
+def build_observatory_state(snapshot):
+    """Turns a StatePoller snapshot into the values shown on the observatory page."""
+    if snapshot is None:
+        snapshot = {"sensors": {}, "gpio_states": {}, "roof_state": "unknown",
+                    "linux_temperatures": {}, "age": None, "timestamp": None, "seq": 0}
+
+    sensor_data = round_floats(snapshot["sensors"])
+
+    gyro_data = sensor_data.get("GY-521", {})
+    # Unread axes (None) fall back to a level roof
+    x, y, z = (gyro_data.get(axis) for axis in ("Accel_x", "Accel_y", "Accel_z"))
+    x, y, z = float(x or 0), float(y or 0), float(1 if z is None else z)
+    tilt_angle = round(compute_tilt_angle(x, y, z))
+
+    return {
+        "seq": snapshot["seq"],
+        "timestamp": snapshot["timestamp"],
+        "age": snapshot["age"],
+        "sensors": sensor_data,
+        "gpio_states": snapshot["gpio_states"],
+        "roof_state": snapshot["roof_state"],
+        "tilt_angle": tilt_angle,
+        "linux_temperatures": snapshot["linux_temperatures"],
+    }
+
+
+def flatten_fields(obj, prefix=""):
+    """{"sensors": {"DHT11": {"Temp": 21}}} -> {"sensors.DHT11.Temp": 21}"""
+    if isinstance(obj, dict):
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        return {prefix: obj}
+
+    fields = {}
+    for key, value in items:
+        fields.update(flatten_fields(value, f"{prefix}.{key}" if prefix else str(key)))
+    return fields
+
+
+@app.route("/api/observatory/state")
+def observatory_state():
+    return jsonify(build_observatory_state(state_poller.snapshot()))
+
+
+@app.route("/api/observatory/stream")
+def observatory_stream():
+    """
+    Server-Sent Events stream for the observatory page. Each event carries
+    only the fields that changed since the previous one, keyed by their
+    dotted path (e.g. "gpio_states.27", "sensors.DHT11.Temp").
+    """
+    def events():
+        sent = {}
+        seq = 0
+        while True:
+            snapshot = state_poller.wait_for_update(seq, timeout=15)
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            seq = snapshot["seq"]
+
+            state = build_observatory_state(snapshot)
+            del state["seq"], state["age"]  # the page derives the age from the timestamp
+            fields = flatten_fields(state)
+            changed = {k: v for k, v in fields.items() if k not in sent or sent[k] != v}
+            sent = fields
+            if changed:
+                yield f"data: {json.dumps(changed)}\n\n"
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/api/safety")
+def safety_status():
+    return jsonify(round_floats(safety_engine.status()))
 
 
 @app.route("/telescope")
@@ -94,27 +232,37 @@ def telescope_page():
 
 @app.route("/wind-map.png")
 def wind_map():
-    fig = plot_vic_wind_data_with_quivers(return_fig=True)
+    png, etag, last_modified = wind_map_cache.get()
+    if png is None:
+        return "Wind map not available yet", 503
+
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # always revalidate, usually a 304
+    return response.make_conditional(request)
 
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    plt.close(fig)
 
-    return send_file(buf, mimetype='image/png')
+@app.route("/api/wind/site")
+def wind_site():
+    hours = max(request.args.get("hours", 6, type=float), 1)  # no zero / negative (empty) windows
+    history = get_wind_history()
+    series = history.site_history(hours=hours)
+    return jsonify({
+        "trend": history.site_trend(hours=min(hours, 3)),
+        "series": round_floats({name: [None if v != v else v for v in values.tolist()]
+                                for name, values in series.items()}),
+    })
 
 
 @app.route("/refresh", methods=["POST"])
 def refresh_map():
     try:
-        fig = plot_vic_wind_data_with_quivers(return_fig=True)
-
-        # Save it to disk (so index page uses the updated image)
-        fig.savefig("static/wind_map.png", bbox_inches='tight')
+        wind_map_cache.refresh(force=True)
         flash("✅ Wind map refreshed successfully.")
     except Exception as e:
         flash(f"❌ Error refreshing wind map: {e}")
-    return redirect(url_for('index'))
+    return redirect(url_for('dashboard'))
 
 
 @app.route("/visibility", methods=["GET", "POST"])
@@ -135,44 +283,85 @@ def visibility_page():
         except Exception as e:
             flash(f"❌ Error plotting object: {e}")
 
-    return render_template("dashboard.html", plot_img=plot_img, celestial=celestial)
+    return render_template("dashboard.html", plot_img=plot_img, celestial=celestial,
+                           tonight_targets=tonights_targets_or_empty(DASHBOARD_TARGETS))
 
 
 @app.route("/files")
 def files_page():
-    file_tree = build_file_tree(ARCHIVE_PATH)
-    return render_template("files.html", file_tree=file_tree)
+    archive_index = get_archive_index(ARCHIVE_PATH)
+    archive_index.refresh(max_age=ARCHIVE_SCAN_INTERVAL)
+    return render_template("files.html", folders=archive_index.folders())
+
+
+@app.route("/api/files/<path:folder>")
+def api_files(folder):
+    offset = request.args.get("offset", 0, type=int)
+    limit = min(request.args.get("limit", 200, type=int), 1000)
+    archive_index = get_archive_index(ARCHIVE_PATH)
+    archive_index.refresh(max_age=ARCHIVE_SCAN_INTERVAL)
+    return jsonify(archive_index.list_files(folder, offset=max(offset, 0), limit=max(limit, 1)))
+
+
+@app.route("/api/archive/integration")
+def archive_integration():
+    rows = get_fits_index(ARCHIVE_PATH).integration(target=request.args.get("target"),
+                                                    night_from=request.args.get("from"),
+                                                    night_to=request.args.get("to"),
+                                                    filter_name=request.args.get("filter"))
+    return jsonify(round_floats(rows))
+
+
+@app.route("/api/archive/frames")
+def archive_frames():
+    rows = get_fits_index(ARCHIVE_PATH).query(target=request.args.get("target"),
+                                              night=request.args.get("night"),
+                                              min_exptime=request.args.get("min_exptime", type=float),
+                                              max_exptime=request.args.get("max_exptime", type=float),
+                                              filter_name=request.args.get("filter"),
+                                              limit=min(request.args.get("limit", 1000, type=int), 10000))
+    return jsonify(rows)
 
 
 @app.route("/files/<path:filepath>")
 def download_file(filepath):
-    return send_from_directory(ARCHIVE_PATH, filepath, as_attachment=False)
+    # Range / If-Range / If-None-Match are answered by werkzeug (206 / 304), and the file
+    # goes out through wsgi.file_wrapper, i.e. sendfile() where the server supports it
+    mimetype = FITS_MIMETYPE if filepath.lower().endswith(FITS_EXTENSIONS) else None
+    return send_from_directory(ARCHIVE_PATH, filepath, as_attachment=False, mimetype=mimetype,
+                               conditional=True, etag=True, max_age=ARCHIVE_MAX_AGE)
+
+
+def content_disposition_names(filename):
+    """
+    Content-Disposition filename parameters as send_file builds them: an ASCII
+    "filename" plus an RFC 5987 "filename*" for names that are not ASCII.
+    """
+    try:
+        filename.encode("ascii")
+        return {"filename": filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        return {"filename": simple, "filename*": f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
 
 
 @app.route("/download_folder", methods=["POST"])
 def download_folder():
     folder = request.form.get("folder_name")
-    base_path = ARCHIVE_PATH  # Update to your actual folder base
-
-    target_path = os.path.join(base_path, folder)
+    target_path = safe_join(ARCHIVE_PATH, folder) if folder else None
 
-    if not os.path.isdir(target_path):
+    # "." or "" would zip the whole archive
+    if (target_path is None or not os.path.isdir(target_path)
+            or os.path.normpath(target_path) == os.path.normpath(ARCHIVE_PATH)):
         flash(f"Folder '{folder}' not found.")
         return redirect(url_for("files_page"))
 
-    # Create zip in memory
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(target_path):
-            for file in files:
-                abs_path = os.path.join(root, file)
-                rel_path = os.path.relpath(abs_path, start=base_path)
-                zipf.write(abs_path, rel_path)
-
-    zip_buffer.seek(0)
-    zip_filename = f"{folder}.zip"
-    return send_file(zip_buffer, mimetype='application/zip',
-                     as_attachment=True, download_name=zip_filename)
+    # Streamed while it is written, so multi-GB nights don't have to fit in memory
+    zip_filename = f"{os.path.basename(os.path.normpath(target_path))}.zip"
+    response = Response(stream_zip(ARCHIVE_PATH, os.path.relpath(target_path, ARCHIVE_PATH)),
+                        mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", **content_disposition_names(zip_filename))
+    return response
 
 
 @app.route("/sync_fits", methods=["POST"])
@@ -182,6 +371,8 @@ def sync_fits():
         dest_root = ARCHIVE_PATH  # Replace with your actual path
 
         sync_fits_files_to_local(crawl_data, dest_root)
+        get_archive_index(ARCHIVE_PATH).refresh()
+        get_fits_index(ARCHIVE_PATH).update()
         flash("✅ FITS files synced successfully.")
     except Exception as e:
         flash(f"❌ Sync failed: {e}")
@@ -208,5 +399,12 @@ def launch_webcam():
 #   $ python website_code/app.py
 #   * Running on http://0.0.0.0:5000/
 
+# Started on import, so they also run under a WSGI server or `flask run`. Not in the
+# watcher process of the debug reloader below: only its serving child may open the Picos.
+# WHOPA_BACKGROUND_SERVICES=0 keeps them off, e.g. when importing the app for tests.
+if (os.environ.get("WHOPA_BACKGROUND_SERVICES", "1") != "0"
+        and not (__name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true")):
+    init_background_services()
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -1,5 +1,7 @@
 import platform
-from utils_picos import get_sensor_values, get_switch_gpio_status
+import threading
+import time
+from utils_picos import get_sensor_values, get_switch_gpio_status, start_sensor_stream
 import yaml
 import psutil
 
@@ -9,24 +11,36 @@ def load_gpios_yaml(filepath="gpios.yaml"):
         return yaml.safe_load(file)
 
 
+def _to_float(value):
+    """Pico reading -> float, or None if it is missing or not a number (e.g. "NA")."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _switch(value):
+    """"1" -> "Closed", "0" -> "Open", anything else (not read) -> None."""
+    return {"1": "Closed", "0": "Open"}.get(value)
+
+
 def get_sensor_data():
     raw = get_sensor_values()
-    print(f"Raw sensor data: {raw}")
 
-    # Normalize and convert
+    # Normalize and convert; readings the Pico did not deliver stay None
     data = {
-        "Ball Switch": "Closed" if raw.get("ball", "0") == "1" else "Open",
-        "Bump Switch 1": "Closed" if raw.get("bump1", "0") == "1" else "Open",
-        "Bump Switch 2": "Closed" if raw.get("bump2", "0") == "1" else "Open",
+        "Ball Switch": _switch(raw.get("ball")),
+        "Bump Switch 1": _switch(raw.get("bump1")),
+        "Bump Switch 2": _switch(raw.get("bump2")),
         "GY-521": {
-            "Accel_x": float(raw.get("accel_x", 0)),
-            "Accel_y": float(raw.get("accel_y", 0)),
-            "Accel_z": float(raw.get("accel_z", 0)),
+            "Accel_x": _to_float(raw.get("accel_x")),
+            "Accel_y": _to_float(raw.get("accel_y")),
+            "Accel_z": _to_float(raw.get("accel_z")),
         },
-        "Rain": float(raw.get("rain", 0)),
+        "Rain": _to_float(raw.get("rain")),
         "DHT11": {
-            "Temp": float(raw.get("temp", 0)),
-            "Humidity": float(raw.get("hum", 0))
+            "Temp": _to_float(raw.get("temp")),
+            "Humidity": _to_float(raw.get("hum"))
         }
     }
 
@@ -38,7 +52,6 @@ def get_gpio_states():
     Returns GPIO status as {pin: bool}
     """
     raw_states = get_switch_gpio_status()
-    print(f"Raw switch states: {raw_states}")
 
     return {pin: (val == 1) for pin, val in raw_states.items()}
 
@@ -47,7 +60,7 @@ def get_roof_state(sensor_data, gpio_states):
     """
     Infers roof state based on ball switch and GPIO outputs
     """
-    ball_switch_triggered = sensor_data.get("Ball Switch", False)
+    ball_switch_triggered = sensor_data.get("Ball Switch") == "Closed"
 
     actuator_extend_on = gpio_states.get(15, False)
     actuator_retract_on = gpio_states.get(26, False)
@@ -84,3 +97,104 @@ def get_linux_temperatures():
         result[chip_name] = chip_readings
 
     return result
+
+
+class StatePoller:
+    """
+    Samples the Picos and the Linux box temperatures in a background thread
+    and keeps the latest timestamped snapshot in memory.
+
+    Web requests read the cached snapshot instead of talking to the hardware,
+    so the cost of a page load does not depend on how many clients are open.
+    """
+
+    def __init__(self, interval=2.0, stream_rate=None):
+        self.interval = interval
+        self.stream_rate = stream_rate
+        self._snapshot = None
+        self._seq = 0
+        self._listeners = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._cond = threading.Condition()
+        self._poll_lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the sampling thread. Calling it again is a no-op.
+        With a ``stream_rate`` (Hz) the sensor Pico is switched to streaming
+        mode, so each sample just reads the latest streamed frame.
+        """
+        if self.stream_rate:
+            start_sensor_stream(rate=self.stream_rate)
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="state-poller",
+                                                daemon=True)
+                self._thread.start()
+
+    def add_listener(self, callback):
+        """Registers ``callback(snapshot)`` to be called after every sample."""
+        self._listeners.append(callback)
+
+    def refresh(self):
+        """Wakes the sampling thread up to take a new sample right away."""
+        self._wake.set()
+
+    def poll_once(self):
+        with self._poll_lock:
+            sensor_data = get_sensor_data()
+            gpio_states = get_gpio_states()
+            snapshot = {
+                "timestamp": time.time(),
+                "sensors": sensor_data,
+                "gpio_states": gpio_states,
+                "roof_state": get_roof_state(sensor_data, gpio_states),
+                "linux_temperatures": get_linux_temperatures(),
+            }
+            with self._cond:
+                self._seq += 1
+                snapshot["seq"] = self._seq
+                self._snapshot = snapshot
+                self._cond.notify_all()
+
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print("❌ Error in state listener:", e)
+        return snapshot
+
+    def _run(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                print("❌ Error polling observatory state:", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def wait_for_update(self, after_seq, timeout=None):
+        """
+        Blocks until a snapshot newer than ``after_seq`` is available and
+        returns it, or returns None after ``timeout`` seconds.
+        """
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot is not None
+                                and self._snapshot["seq"] > after_seq, timeout=timeout)
+            if self._snapshot is None or self._snapshot["seq"] <= after_seq:
+                return None
+            return dict(self._snapshot, age=time.time() - self._snapshot["timestamp"])
+
+    def snapshot(self, timeout=10):
+        """
+        Returns the latest snapshot with its "age" in seconds, starting the
+        sampling thread on first use and waiting for its first sample.
+        """
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._snapshot is not None, timeout=timeout)
+            if self._snapshot is None:
+                return None
+            return dict(self._snapshot, age=time.time() - self._snapshot["timestamp"])
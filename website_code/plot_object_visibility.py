@@ -2,23 +2,23 @@ from datetime import datetime
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
-from astroquery.simbad import Simbad
 from astropy.coordinates import SkyCoord, EarthLocation, AltAz
 from astropy.time import Time
 from astropy import units as u
 
+from utils_name_resolver import resolve_object
+from utils_ngc_catalog import get_catalog
+from utils_visibility import compute_visibility, WHOPA_LAT, WHOPA_LON
 
-def get_object_coords(name):
-    """Query Simbad to get SkyCoord of a named object."""
-    result = Simbad.query_object(name)
-    if result is None or len(result) == 0:
-        raise ValueError(f"❌ SIMBAD could not find object: '{name}'")
 
-    ra = result["ra"][0]
-    dec = result["dec"][0]
-    return SkyCoord(str(ra) + " " + str(dec), unit=(u.hourangle, u.deg),
-                    frame="icrs")
+def get_object_coords(name):
+    """
+    Get SkyCoord of a named object, from the local name cache / NGC.csv
+    if possible and from Sesame (SIMBAD, NED, VizieR) otherwise.
+    """
+    return resolve_object(name)
 
 
 def plot_altitude_for_seasons(
@@ -27,11 +27,8 @@ def plot_altitude_for_seasons(
         save_path=None
 ):
     """Plots altitude vs. time for an object over a night for four seasonal dates."""
-    location_lat = -37.30303,
-    location_lon = 144.41624,
     location_name = "Tylden, VIC"
 
-    location = EarthLocation(lat=location_lat * u.deg, lon=location_lon * u.deg)
     dates = ["2025-03-21", "2025-06-21", "2025-09-21", "2025-12-21"]
     labels = ["March Equinox", "June Solstice", "September Equinox",
               "December Solstice"]
@@ -40,24 +37,20 @@ def plot_altitude_for_seasons(
     # Finer granularity: every 10 minutes = 1/6 hour
     hours = np.arange(20, 30, 1 / 6)  # from 20:00 to 05:00
 
-    def times_utc(date):
-        utc_offset = location.lon.value / 15  # Convert degrees to hours
-        times = [f"{date}T{int(h % 24):02d}:{int((h % 1) * 60):02d}:00" for h in
-                 hours]
-        return Time(times) - utc_offset * u.hour
-
     obj_coord = get_object_coords(object_name)
 
+    # All four dates in one go (clock hours are local mean solar time)
+    visibility = compute_visibility(obj_coord.ra.deg, obj_coord.dec.deg, dates, hours,
+                                    min_altitude=min_altitude,
+                                    lat_deg=WHOPA_LAT, lon_deg=WHOPA_LON)
+
     plt.figure(figsize=(10, 6))
 
     # Add shaded gray band between 0–30° altitude
     plt.axhspan(0, min_altitude, facecolor='darkgray', alpha=0.4, zorder=0)
 
     for i, date in enumerate(dates):
-        times = times_utc(date)
-        altaz_frame = AltAz(obstime=times, location=location)
-        altaz = obj_coord.transform_to(altaz_frame)
-        altitudes = altaz.alt.deg
+        altitudes = visibility["altitude"][0, i]
 
         plt.plot(hours, altitudes, label=labels[i], color=colors[i])
         above_mask = np.array(altitudes) >= min_altitude
@@ -90,32 +83,34 @@ def plot_altitude_for_seasons(
         plt.show()
 
 
-from pyongc import data
-NGC_CAT = data.all()
-
-
 def find_ngc_near_zenith(latitude=-37.303071, longitude=144.41625, elevation=550, radius_deg=30):
     location = EarthLocation(lat=latitude*u.deg, lon=longitude*u.deg, height=elevation*u.m)
     now = Time(datetime.utcnow())
     altaz_frame = AltAz(obstime=now, location=location)
     zenith = SkyCoord(alt=90*u.deg, az=0*u.deg, frame=altaz_frame).transform_to('icrs')
 
-    catalog = NGC_CAT.dropna(subset=['ra', 'dec', 'majax', 'minax'])
-
-    coords = SkyCoord(ra=catalog['ra'].values*u.rad, dec=catalog['dec'].values*u.rad)
-    separations = zenith.separation(coords)
-    mask = separations < radius_deg * u.deg
-    near_zenith = catalog[mask].copy()
+    catalog = get_catalog()
+    idx, separations = catalog.cone_search(zenith.ra.deg, zenith.dec.deg, radius_deg,
+                                           exclude_types=None)
+    has_size = ~np.isnan(catalog.majax[idx]) & ~np.isnan(catalog.minax[idx])
+    idx, separations = idx[has_size], separations[has_size]
 
     # Transform to AltAz for azimuth
-    altaz = coords[mask].transform_to(altaz_frame)
-    near_zenith['separation_deg'] = separations[mask].deg
-    near_zenith['azimuth_deg'] = altaz.az.deg
-    near_zenith['sky_area'] = near_zenith['majax'] * near_zenith['minax']
-
-    return near_zenith[['name', 'type', 'ra', 'dec', 'vmag',
-                        'majax', 'minax', 'sky_area',
-                        'separation_deg', 'azimuth_deg']]
+    coords = SkyCoord(ra=catalog.ra[idx]*u.deg, dec=catalog.dec[idx]*u.deg)
+    altaz = coords.transform_to(altaz_frame)
+
+    return pd.DataFrame({
+        "name": catalog.name[idx],
+        "type": catalog.type[idx],
+        "ra": np.deg2rad(catalog.ra[idx]),
+        "dec": np.deg2rad(catalog.dec[idx]),
+        "vmag": catalog.vmag[idx],
+        "majax": catalog.majax[idx],
+        "minax": catalog.minax[idx],
+        "sky_area": catalog.majax[idx] * catalog.minax[idx],
+        "separation_deg": separations,
+        "azimuth_deg": altaz.az.deg,
+    })
 
 
 def plot_ngc_polar(catalog_df, label_top_n=5):
@@ -1,10 +1,9 @@
 from datetime import datetime
 import pytz
 
-import asyncio
-import aiohttp
+from utils_bom_client import get_bom_client
+from utils_wind_interp import get_station_interpolator
 
-from scipy.interpolate import griddata
 import numpy as np
 
 import matplotlib.pyplot as plt
@@ -13,39 +12,40 @@ from matplotlib.lines import Line2D
 from matplotlib.colors import LinearSegmentedColormap
 
 
-async def fetch_json(session, url, station_id):
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                      "(KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36"
-    }
-    try:
-        async with session.get(url, headers=headers) as response:
-            response.raise_for_status()
-            data = await response.json()
-            return (station_id, data)
-    except Exception as e:
-        print(f"Error fetching {station_id}: {e}")
-        return (station_id, None)
+# BoM stations around WHOPA used for the wind map
+STATION_IDS = [95853, 94852, 94860, 94866, 94856, 94859,
+               94863, 94865, 94849, 95845, 94855, 94874,
+               95840, 94834, 94839, 95836, 94881, 94864,
+               95864, 95833, 94876]
 
+# Compass wind direction (where the wind comes from) in degrees
+COMPASS_DIRS = {
+    'N': 0, 'NNE': 22.5, 'NE': 45, 'ENE': 67.5,
+    'E': 90, 'ESE': 112.5, 'SE': 135, 'SSE': 157.5,
+    'S': 180, 'SSW': 202.5, 'SW': 225, 'WSW': 247.5,
+    'W': 270, 'WNW': 292.5, 'NW': 315, 'NNW': 337.5
+}
 
-async def fetch_all_jsons(station_ids):
-    base_url = "http://www.bom.gov.au/fwo/IDV60801/IDV60801.{station_id}.json"
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            fetch_json(session, base_url.format(station_id=station_id), station_id)
-            for station_id in station_ids
-        ]
-        return await asyncio.gather(*tasks)
+CENTER_LON = 144.4165
+CENTER_LAT = -37.3031
+
+# Interpolation grid for the colour map, with the WHOPA position appended as the last point
+GRID_X, GRID_Y = np.meshgrid(
+    np.linspace(CENTER_LON - 1., CENTER_LON + 1., 200),
+    np.linspace(CENTER_LAT - 1., CENTER_LAT + 1., 200)
+)
+QUERY_POINTS = np.vstack([np.column_stack([GRID_X.ravel(), GRID_Y.ravel()]),
+                          [[CENTER_LON, CENTER_LAT]]])
 
 
 def get_all_station_data(station_ids):
-    try:
-        return asyncio.run(fetch_all_jsons(station_ids))
-    except RuntimeError:
-        # For Jupyter compatibility
-        import nest_asyncio
-        nest_asyncio.apply()
-        return asyncio.run(fetch_all_jsons(station_ids))
+    """
+    Returns [(station_id, data)] for the given stations, data being the parsed
+    BoM JSON (None if the station could never be fetched). Goes through the
+    shared BomStationClient, so unchanged stations are not downloaded again.
+    """
+    return [(station_id, data)
+            for station_id, data, _ in get_bom_client().fetch_all(station_ids)]
 
 
 def is_inside_map(lon, lat, ax):
@@ -74,14 +74,7 @@ def get_delta_time(timestamp_str):
 
 def wind_dir_to_uv(wind_dir):
     """Convert compass wind direction string to unit vector (u, v)."""
-    compass_dirs = {
-        'N': 0, 'NNE': 22.5, 'NE': 45, 'ENE': 67.5,
-        'E': 90, 'ESE': 112.5, 'SE': 135, 'SSE': 157.5,
-        'S': 180, 'SSW': 202.5, 'SW': 225, 'WSW': 247.5,
-        'W': 270, 'WNW': 292.5, 'NW': 315, 'NNW': 337.5
-    }
-
-    angle = compass_dirs.get(wind_dir.upper(), None)
+    angle = COMPASS_DIRS.get(wind_dir.upper(), None)
     if angle is None:
         return 0, 0  # Unknown direction
 
@@ -101,9 +94,13 @@ def wind_speed_color(speed):
     else:
         return 'red'
 
-def plot_vic_wind_data_with_quivers(return_fig=False):
-    center_lat = -37.3031
-    center_lon = 144.4165
+def plot_vic_wind_data_with_quivers(return_fig=False, station_data=None):
+    """
+    Plots the interpolated wind field around WHOPA. ``station_data`` is the
+    output of get_all_station_data(STATION_IDS) and is fetched if not given.
+    """
+    center_lat = CENTER_LAT
+    center_lon = CENTER_LON
 
     fig, ax = plt.subplots(figsize=(10, 10))
     ax.axis('equal')
@@ -133,12 +130,8 @@ def plot_vic_wind_data_with_quivers(return_fig=False):
     u_values = []
     v_values = []
 
-    station_ids = [95853, 94852, 94860, 94866, 94856, 94859,
-                   94863, 94865, 94849, 95845, 94855, 94874,
-                   95840, 94834, 94839, 95836, 94881, 94864,
-                   95864, 95833, 94876]
-
-    station_data = get_all_station_data(station_ids)
+    if station_data is None:
+        station_data = get_all_station_data(STATION_IDS)
 
     for station_id, data in station_data:
         if data is None:
@@ -198,22 +191,15 @@ def plot_vic_wind_data_with_quivers(return_fig=False):
         except Exception as e:
             print(f"Failed for station {station_id}: {e}")
 
-    # Create grid
-    grid_x, grid_y = np.meshgrid(
-        np.linspace(center_lon - 1., center_lon + 1., 200),
-        np.linspace(center_lat - 1., center_lat + 1., 200)
-    )
-
-    # Interpolate
-    grid_z = griddata(points, values, (grid_x, grid_y), method='cubic')
-    grid_z = np.clip(grid_z, 0, 100)
-
-    # Interpolate wind components and speed at center
-    interp_speed = griddata(points, values, (center_lon, center_lat), method='cubic')
-    interp_u = griddata(points, u_values, (center_lon, center_lat), method='cubic')
-    interp_v = griddata(points, v_values, (center_lon, center_lat), method='cubic')
+    # Interpolate speed, u and v on the grid and at the center in one go.
+    # The weights only depend on which stations are valid, so they are reused between renders.
+    interp = get_station_interpolator(points)
+    fields = interp(np.column_stack([values, u_values, v_values]).reshape(-1, 3), QUERY_POINTS)
+    grid_x, grid_y = GRID_X, GRID_Y
+    grid_z = np.clip(fields[:-1, 0].reshape(GRID_X.shape), 0, 100)
+    interp_speed, interp_u, interp_v = fields[-1]
 
-    if interp_u is not None and interp_v is not None:
+    if np.isfinite(interp_u) and np.isfinite(interp_v):
         center_color = wind_speed_color(interp_speed)
         scale_factor = 0.001  # same as other arrows
         ax.quiver(
@@ -0,0 +1,141 @@
+from collections import deque
+import threading
+import time
+
+from utils_picos import get_sensor_values, set_switch_device_action
+
+END_STOP_INTERVAL = 0.2  # seconds between end-stop checks while a device is moving
+OFF_RETRIES = 10  # further "off" attempts after a failed one before giving up on a device
+OFF_RETRY_DELAY = 1  # seconds between them
+
+# Sensor Pico keys that signal the end of a movement: (device, action) -> keys, any of them "1"
+END_STOPS = {
+    ("Actuator", "extend"): ("ball",),
+    ("Actuator", "retract"): ("bump1", "bump2"),
+}
+
+
+def drive_times_from_gpios(gpios_config):
+    """{device name: drive_time in seconds} for every output in gpios.yaml that has one."""
+    drive_times = {}
+    for board in gpios_config:
+        for sub_device in board.get("sub_devices", []):
+            drive_time = sub_device.get("connection", {}).get("drive_time")
+            if drive_time:
+                drive_times[sub_device["name"]] = float(drive_time)
+    return drive_times
+
+
+class ActuatorWatchdog:
+    """
+    Switches devices off again after their ``drive_time`` from gpios.yaml.
+
+    ``notify(device, action)`` is registered as a switch listener, so a timer
+    is armed the moment set_switch_device_action starts a movement, and an
+    "off" disarms it. While a device with end stops is moving, the sensor
+    Pico is checked every END_STOP_INTERVAL seconds (a memory read while the
+    sensor stream runs) and the device is stopped as soon as its end stop
+    closes. A failed "off" is retried up to OFF_RETRIES times; every stop
+    and every give-up is recorded in ``events``.
+    """
+
+    def __init__(self, gpios_config, end_stop_interval=END_STOP_INTERVAL):
+        self.drive_times = drive_times_from_gpios(gpios_config)
+        self.end_stop_interval = end_stop_interval
+        self._armed = {}  # device -> (action, deadline)
+        self._off_failures = {}  # device -> failed "off" attempts of the current movement
+        self.events = deque(maxlen=100)
+        self._thread = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="actuator-watchdog",
+                                                daemon=True)
+                self._thread.start()
+
+    def notify(self, device, action, since=None):
+        """Arms (or with "off" disarms) the timer of ``device``; ``since`` is when the command was sent."""
+        if device not in self.drive_times:
+            return
+        self.start()
+        with self._cond:
+            self._off_failures.pop(device, None)
+            if action == "off":
+                self._armed.pop(device, None)
+            else:
+                start = time.time() if since is None else since
+                self._armed[device] = (action, start + self.drive_times[device])
+            self._cond.notify_all()
+
+    def armed(self):
+        """{device: (action, seconds left)} of the running timers."""
+        with self._cond:
+            now = time.time()
+            return {device: (action, deadline - now) for device, (action, deadline) in self._armed.items()}
+
+    def _due(self, armed, now):
+        """Devices of ``armed`` to stop now, each with the reason."""
+        due = []
+        sensors = None
+        for device, (action, deadline) in armed.items():
+            if now >= deadline:
+                due.append((device, action, "drive time reached"))
+                continue
+            keys = END_STOPS.get((device, action))
+            if keys:
+                if sensors is None:
+                    sensors = get_sensor_values()
+                hit = [key for key in keys if sensors.get(key) == "1"]
+                if hit:
+                    due.append((device, action, f"end stop {'/'.join(hit)}"))
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._armed)
+                now = time.time()
+                next_deadline = min(deadline for _, deadline in self._armed.values())
+                polling = any((device, action) in END_STOPS
+                              for device, (action, _) in self._armed.items())
+                timeout = next_deadline - now
+                if polling:
+                    timeout = min(timeout, self.end_stop_interval)
+                if timeout > 0:
+                    # notify() wakes us up early when timers change
+                    self._cond.wait(timeout)
+                armed = dict(self._armed)
+
+            try:
+                due = self._due(armed, time.time())
+            except Exception as e:
+                print("❌ Error checking actuator end stops:", e)
+                due = [(device, action, "drive time reached") for device, (action, deadline)
+                       in armed.items() if time.time() >= deadline]
+
+            for device, action, reason in due:
+                print(f"🛑 {device} {action}: {reason} — switching off")
+                # Not holding the lock: set_switch_device_action calls notify(device, "off")
+                stopped = set_switch_device_action(device, "off")
+                with self._cond:
+                    if stopped:
+                        # Our "off" already disarmed it through notify(); this is for listener-less use
+                        if self._armed.get(device) == armed[device]:
+                            del self._armed[device]
+                        self.events.append({"time": time.time(), "event": "stop", "device": device,
+                                            "action": action, "reason": reason})
+                        continue
+                    if self._armed.get(device) != armed[device]:
+                        continue  # re-armed or stopped by someone else meanwhile
+                    failures = self._off_failures.get(device, 0) + 1
+                    if failures > OFF_RETRIES:
+                        del self._armed[device]
+                        self._off_failures.pop(device, None)
+                        print(f"❌ {device} {action}: could not switch off after {failures} attempts, giving up")
+                        self.events.append({"time": time.time(), "event": "stop_failed", "device": device,
+                                            "action": action, "reason": reason, "attempts": failures})
+                    else:
+                        self._off_failures[device] = failures
+                        self._armed[device] = (action, time.time() + OFF_RETRY_DELAY)
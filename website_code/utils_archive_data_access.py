@@ -1,20 +1,191 @@
 import os
+import sqlite3
+import threading
+import time
+import zipfile
 
-def build_file_tree(root_dir):
-    tree = []
-    for foldername in sorted(os.listdir(root_dir)):
-        folder_path = os.path.join(root_dir, foldername)
-        if os.path.isdir(folder_path):
-            files = []
-            for filename in sorted(os.listdir(folder_path)):
-                file_path = os.path.join(foldername, filename)
-                files.append({
-                    "name": filename,
-                    "path": file_path
-                })
-            tree.append({
-                "name": foldername,
-                "files": files,
-                "count": len(files)  # ← Add this line
-            })
-    return tree
+ARCHIVE_INDEX_DB = "/home/ingo/WHOPA/archive_index.sqlite"
+ARCHIVE_SCAN_INTERVAL = 30  # seconds, pages re-scan the archive at most this often
+
+
+class ArchiveIndex:
+    """
+    SQLite index of every file below the archive root, grouped by top-level
+    folder, so the /files page and its API read counts, sizes and pages of
+    file names from the index instead of listing the archive per request.
+
+    ``refresh`` is an incremental mtime scan: a directory's mtime changes
+    whenever entries are added, removed or renamed in it, so only those
+    directories are listed again. Unchanged ones cost a single stat (their
+    subdirectories are taken from the index).
+    """
+
+    def __init__(self, root, path=ARCHIVE_INDEX_DB):
+        self.root = root
+        self.path = path
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._last_scan = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS dirs "
+                               "(path TEXT PRIMARY KEY, parent TEXT, mtime REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, "
+                               "folder TEXT, name TEXT, size INTEGER, mtime REAL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_folder ON files (folder, path)")
+
+    def refresh(self, max_age=0):
+        """Brings the index up to date, unless the last scan is less than ``max_age`` seconds old."""
+        with self._scan_lock:
+            if time.time() - self._last_scan < max_age:
+                return
+            self._scan()
+            self._last_scan = time.time()
+
+    def _scan(self):
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM dirs"))
+            children = {}
+            for path, parent in self._conn.execute("SELECT path, parent FROM dirs"):
+                children.setdefault(parent, []).append(path)
+
+        seen = set()
+        changed = {}  # dir -> (mtime, [subdirs], [file rows])
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(self.root, rel_dir)
+            try:
+                mtime = os.stat(abs_dir).st_mtime
+            except OSError:
+                continue
+            seen.add(rel_dir)
+            if known.get(rel_dir) == mtime:
+                stack.extend(children.get(rel_dir, []))
+                continue
+
+            subdirs, files = [], []
+            folder = rel_dir.split("/", 1)[0]
+            try:
+                with os.scandir(abs_dir) as entries:
+                    for entry in entries:
+                        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(rel_path)
+                        elif entry.is_file() and not entry.name.startswith("."):
+                            st = entry.stat()
+                            files.append((rel_path, rel_dir, folder, entry.name, st.st_size, st.st_mtime))
+            except OSError as e:
+                print(f"❌ Could not list {abs_dir}: {e}")
+                continue
+            changed[rel_dir] = (mtime, subdirs, files)
+            stack.extend(subdirs)
+
+        removed = set(known) - seen
+        if not changed and not removed:
+            return
+        with self._lock, self._conn:
+            for rel_dir in removed:
+                self._conn.execute("DELETE FROM dirs WHERE path = ?", (rel_dir,))
+                self._conn.execute("DELETE FROM files WHERE dir = ?", (rel_dir,))
+            for rel_dir, (mtime, subdirs, files) in changed.items():
+                parent = None if rel_dir == "" else os.path.dirname(rel_dir)
+                self._conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime) VALUES (?, ?, ?)",
+                                   (rel_dir, parent, mtime))
+                self._conn.execute("DELETE FROM files WHERE dir = ?", (rel_dir,))
+                self._conn.executemany("INSERT INTO files (path, dir, folder, name, size, mtime) "
+                                       "VALUES (?, ?, ?, ?, ?, ?)", files)
+
+    def folders(self):
+        """Top-level folders with their file count, total size (bytes) and newest file time."""
+        with self._lock:
+            names = [row[0] for row in self._conn.execute(
+                "SELECT path FROM dirs WHERE parent = '' ORDER BY path")]
+            stats = {row[0]: row[1:] for row in self._conn.execute(
+                "SELECT folder, COUNT(*), SUM(size), MAX(mtime) FROM files "
+                "WHERE folder != '' GROUP BY folder")}
+        return [{"name": name,
+                 "count": stats.get(name, (0,))[0],
+                 "size": stats.get(name, (0, 0))[1] or 0,
+                 "mtime": stats.get(name, (0, 0, None))[2]}
+                for name in names]
+
+    def list_files(self, folder, offset=0, limit=200):
+        """One page of the files in ``folder`` (recursively), ordered by path."""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM files WHERE folder = ?",
+                                       (folder,)).fetchone()[0]
+            rows = self._conn.execute("SELECT name, path, size, mtime FROM files WHERE folder = ? "
+                                      "ORDER BY path LIMIT ? OFFSET ?", (folder, limit, offset)).fetchall()
+        return {
+            "folder": folder,
+            "count": total,
+            "offset": offset,
+            "files": [{"name": name, "path": path, "size": size, "mtime": mtime}
+                      for name, path, size, mtime in rows],
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_archive_index(root):
+    """The shared ArchiveIndex of the archive at ``root``."""
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = ArchiveIndex(root)
+        return _indexes[root]
+
+
+ZIP_CHUNK_SIZE = 1 << 20  # bytes read (and sent) at a time
+
+
+class _ZipStream:
+    """Write-only file object collecting what ZipFile writes until it is sent."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(base_path, folder, compression=zipfile.ZIP_STORED, chunk_size=ZIP_CHUNK_SIZE):
+    """
+    Yields a zip of ``base_path/folder`` piece by piece while reading the
+    files, so memory use does not depend on the folder size and the first
+    bytes go out straight away. Entry names are relative to ``base_path``.
+
+    FITS data hardly compresses, so entries are stored by default. The
+    output stream is not seekable, so sizes and CRCs follow each entry in a
+    data descriptor; ZIP64 records are used for entries and archives past
+    4 GB.
+    """
+    target_path = os.path.join(base_path, folder)
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=compression, allowZip64=True) as zipf:
+        for root, dirs, files in os.walk(target_path):
+            dirs.sort()
+            for file in sorted(files):
+                abs_path = os.path.join(root, file)
+                zinfo = zipfile.ZipInfo.from_file(abs_path, os.path.relpath(abs_path, start=base_path))
+                zinfo.compress_type = compression
+                with open(abs_path, "rb") as src, zipf.open(zinfo, "w") as dst:
+                    for chunk in iter(lambda: src.read(chunk_size), b""):
+                        dst.write(chunk)
+                        yield stream.pop()
+                yield stream.pop()
+    yield stream.pop()  # central directory
@@ -1,102 +1,180 @@
+import threading
 from astropy.time import Time
 from astropy.coordinates import EarthLocation, AltAz, get_body, SkyCoord
 from astropy.coordinates import solar_system_ephemeris
 from astropy import units as u
 from astroplan import Observer, FixedTarget
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import numpy as np
 
+from utils_name_resolver import resolve_object
+
+MELB_TZ = pytz.timezone("Australia/Melbourne")
+WHOPA_LOCATION = EarthLocation(lat=-37.3031*u.deg, lon=144.4165*u.deg, height=300*u.m)
+
+# Targets shown on the dashboard: key prefix -> name to resolve
+TRACKED_TARGETS = {
+    "lmc": "Large Magellanic Cloud",
+    "m42": "M42",
+    "sgrA": "Sgr A*",
+}
+
+EPHEMERIS_STEP_MINUTES = 5
+EPHEMERIS_SPAN_HOURS = 49  # from local noon, so "next" events are always inside the grid
+
+
+def night_start(when):
+    """Local noon starting the observing night that ``when`` belongs to."""
+    local = when.astimezone(MELB_TZ)
+    if local.hour < 12:
+        local -= timedelta(days=1)
+    return MELB_TZ.localize(datetime(local.year, local.month, local.day, 12))
+
+
+class NightEphemeris:
+    """
+    Sun, moon and tracked-target positions precomputed on a regular time grid
+    for one observing night. Values for "now" are interpolated from the grid
+    and rise/set times are found as horizon crossings of the gridded altitudes,
+    so the expensive astropy transforms run once per night.
+    """
+
+    def __init__(self, start, targets=TRACKED_TARGETS,
+                 step_minutes=EPHEMERIS_STEP_MINUTES, span_hours=EPHEMERIS_SPAN_HOURS):
+        self.start = start
+        n_steps = int(span_hours * 60 / step_minutes) + 1
+        self.times = Time(start.astimezone(pytz.utc)) + np.arange(n_steps) * step_minutes * u.min
+        self.unix = self.times.unix
+
+        altaz_frame = AltAz(obstime=self.times, location=WHOPA_LOCATION)
+        with solar_system_ephemeris.set('builtin'):
+            sun = get_body("sun", self.times)
+            moon = get_body("moon", self.times)
+            self.sun_alt = sun.transform_to(altaz_frame).alt.deg
+            self.moon_alt = moon.transform_to(altaz_frame).alt.deg
+
+        self.moon = moon
+        elongation = sun.separation(moon).rad
+        self.moon_illum = (1 + np.cos(elongation)) / 2 * 100
+
+        # RA of Zenith, East and West Horizon (unwrapped so they interpolate smoothly)
+        self.ref_ra = {}
+        for key, alt, az in [("zenith", 90, 0), ("east", 0, 90), ("west", 0, 270)]:
+            altaz = SkyCoord(alt=np.full(n_steps, alt) * u.deg, az=np.full(n_steps, az) * u.deg,
+                             frame=altaz_frame)
+            self.ref_ra[key] = np.rad2deg(np.unwrap(altaz.transform_to('icrs').ra.rad))
+
+        self.target_alt = {}
+        self.target_az = {}
+        for key, name in targets.items():
+            try:
+                obj = resolve_object(name)
+            except ValueError as e:
+                print(f"❌ Could not resolve {name}: {e}")
+                continue
+            altaz = obj.transform_to(altaz_frame)
+            self.target_alt[key] = altaz.alt.deg
+            self.target_az[key] = np.rad2deg(np.unwrap(altaz.az.rad))
+
+    def covers(self, when):
+        return self.unix[0] <= when.timestamp() <= self.unix[-1]
+
+    def value_at(self, values, when, angle=False):
+        value = float(np.interp(when.timestamp(), self.unix, values))
+        return value % 360 if angle else value
+
+    def next_crossing(self, altitudes, when, horizon=0.0, rising=True):
+        """Local datetime when ``altitudes`` next crosses ``horizon``, or None."""
+        above = altitudes >= horizon
+        if rising:
+            idx = np.nonzero(~above[:-1] & above[1:])[0]
+        else:
+            idx = np.nonzero(above[:-1] & ~above[1:])[0]
+        if len(idx) == 0:
+            return None
+
+        a0, a1 = altitudes[idx], altitudes[idx + 1]
+        crossing = self.unix[idx] + (horizon - a0) / (a1 - a0) * (self.unix[idx + 1] - self.unix[idx])
+        crossing = crossing[crossing > when.timestamp()]
+        if len(crossing) == 0:
+            return None
+        return datetime.fromtimestamp(crossing[0], MELB_TZ)
+
+
+_ephemeris = None
+_ephemeris_lock = threading.Lock()
+
+
+def get_night_ephemeris(when=None):
+    """Returns the cached NightEphemeris for the night of ``when`` (default: now)."""
+    global _ephemeris
+    when = datetime.now(MELB_TZ) if when is None else when
+    with _ephemeris_lock:
+        if _ephemeris is None or _ephemeris.start != night_start(when):
+            _ephemeris = NightEphemeris(night_start(when))
+        return _ephemeris
+
 
 def get_sun_moon_altitudes():
     # === 1. Setup ===
-    melb = pytz.timezone("Australia/Melbourne")
-    now_local = datetime.now(melb)
-    now_utc = now_local.astimezone(pytz.utc)
-    observing_time = Time(now_utc)
-
-    location = EarthLocation(lat=-37.3031*u.deg, lon=144.4165*u.deg, height=300*u.m)
-    observer = Observer(location=location, timezone=melb)
-
-    # === 2. Altitudes ===
-    altaz_frame = AltAz(obstime=observing_time, location=location)
-    with solar_system_ephemeris.set('builtin'):
-        sun = get_body("sun", observing_time)
-        moon = get_body("moon", observing_time)
-
-        sun_alt = sun.transform_to(altaz_frame).alt
-        moon_alt = moon.transform_to(altaz_frame).alt
-
-    # === 3. Moon phase as % ===
-    elongation = sun.separation(moon)
-    phase_angle = elongation.deg
-    illumination = (1 + np.cos(np.deg2rad(phase_angle))) / 2
-    moon_illum_percent = round(illumination * 100, 1)
-
-    # === 4. Rise/Set Times ===
-    sun_rise = observer.sun_rise_time(observing_time, which='next').to_datetime(timezone=melb)
-    sun_set  = observer.sun_set_time(observing_time, which='next').to_datetime(timezone=melb)
-    moon_rise = observer.moon_rise_time(observing_time, which='next').to_datetime(timezone=melb)
-    moon_set  = observer.moon_set_time(observing_time, which='next').to_datetime(timezone=melb)
-
-    # === 5. Split local time into separate parts ===
-    local_date = now_local.strftime("%Y-%m-%d")
-    local_time = now_local.strftime("%H:%M")
-    timezone = now_local.strftime("%Z")
-
-    # 6=== RA/Dec of Zenith, East, and West Horizon ===
-    altaz_frame = AltAz(obstime=observing_time, location=location)
-
-    zenith_altaz = SkyCoord(alt=90 * u.deg, az=0 * u.deg, frame=altaz_frame)
-    east_altaz = SkyCoord(alt=0 * u.deg, az=90 * u.deg, frame=altaz_frame)
-    west_altaz = SkyCoord(alt=0 * u.deg, az=270 * u.deg, frame=altaz_frame)
-
-    zenith_radec = zenith_altaz.transform_to('icrs')
-    east_radec = east_altaz.transform_to('icrs')
-    west_radec = west_altaz.transform_to('icrs')
-
-    zenith_dec = int(location.lat.to_value(u.deg))
-
-    # 6=== Current Alt/Az of LMC, Sgr A*, Orion ===
-    lmc_alt, lmc_az, lmc_status, lmc_next_rise = altaz_for_object("Large Magellanic Cloud", location, observing_time)
-    m42_alt, m42_az, m42_status, m42_next_rise = altaz_for_object("M42", location, observing_time)
-    sgrA_alt, sgrA_az, sgrA_status, sgrA_next_rise = altaz_for_object("Sgr A*", location, observing_time)
+    now_local = datetime.now(MELB_TZ)
+    ephem = get_night_ephemeris(now_local)
+
+    def hhmm(event):
+        return event.strftime("%H:%M") if event is not None else "N/A"
+
+    # === 2. Altitudes and Moon phase as % ===
+    moon_illum_percent = round(ephem.value_at(ephem.moon_illum, now_local), 1)
+
+    # === 3. Tracked targets ===
+    targets = {}
+    for key in TRACKED_TARGETS:
+        if key in ephem.target_alt:
+            alt = round(ephem.value_at(ephem.target_alt[key], now_local), 1)
+            az = round(ephem.value_at(ephem.target_az[key], now_local, angle=True), 1)
+            next_rise = hhmm(ephem.next_crossing(ephem.target_alt[key], now_local, horizon=30))
+        else:
+            alt, az, next_rise = None, None, "N/A"
+        targets[f"{key}_alt"] = alt
+        targets[f"{key}_az"] = az
+        targets[f"{key}_status"] = target_status(alt, az)
+        targets[f"{key}_next_rise"] = next_rise
 
     return {
-        "local_date": local_date,
-        "local_time": local_time,
-        "timezone": timezone,
-        "sun_alt": sun_alt.to_value(u.deg),
-        "moon_alt": moon_alt.to_value(u.deg),
-        "moon_illum": moon_illum_percent,
-        "sun_rise": sun_rise.strftime("%H:%M"),
-        "sun_set": sun_set.strftime("%H:%M"),
-        "moon_rise": moon_rise.strftime("%H:%M"),
-        "moon_set": moon_set.strftime("%H:%M"),
+        "local_date": now_local.strftime("%Y-%m-%d"),
+        "local_time": now_local.strftime("%H:%M"),
+        "timezone": now_local.strftime("%Z"),
+        "sun_alt": ephem.value_at(ephem.sun_alt, now_local),
+        "moon_alt": ephem.value_at(ephem.moon_alt, now_local),
         "moon_illum": moon_illum_percent,
+        "sun_rise": hhmm(ephem.next_crossing(ephem.sun_alt, now_local, rising=True)),
+        "sun_set": hhmm(ephem.next_crossing(ephem.sun_alt, now_local, rising=False)),
+        "moon_rise": hhmm(ephem.next_crossing(ephem.moon_alt, now_local, rising=True)),
+        "moon_set": hhmm(ephem.next_crossing(ephem.moon_alt, now_local, rising=False)),
         "moon_emoji": moon_emoji_from_illum(moon_illum_percent),
-        "zenith_dec": zenith_dec,
-        "zenith_ra": int(zenith_radec.ra.to(u.deg).value),
-        "east_ra": int(east_radec.ra.to(u.deg).value),
-        "west_ra": int(west_radec.ra.to(u.deg).value),
-        "lmc_alt": lmc_alt,
-        "lmc_az": lmc_az,
-        "lmc_status": lmc_status,
-        "lmc_next_rise": lmc_next_rise,
-        "m42_alt": m42_alt,
-        "m42_az": m42_az,
-        "m42_status": m42_status,
-        "m42_next_rise": m42_next_rise,
-        "sgrA_alt": sgrA_alt,
-        "sgrA_az": sgrA_az,
-        "sgrA_status": sgrA_status,
-        "sgrA_next_rise": sgrA_next_rise,
+        "zenith_dec": int(WHOPA_LOCATION.lat.to_value(u.deg)),
+        "zenith_ra": int(ephem.value_at(ephem.ref_ra["zenith"], now_local, angle=True)),
+        "east_ra": int(ephem.value_at(ephem.ref_ra["east"], now_local, angle=True)),
+        "west_ra": int(ephem.value_at(ephem.ref_ra["west"], now_local, angle=True)),
+        **targets,
     }
 
 
+def target_status(alt, az):
+    if alt is None:
+        return "⚠️ Unknown"
+    elif alt < 30:
+        return "🔻 Not visible (below 30°)"
+    elif az < 180:
+        return "⬆️ Rising"
+    else:
+        return "⬇️ Setting"
+
+
 def altaz_for_object(name, location, observing_time):
     try:
-        obj = SkyCoord.from_name(name)
+        obj = resolve_object(name)
         altaz = obj.transform_to(AltAz(obstime=observing_time, location=location))
         alt = round(altaz.alt.to_value(u.deg), 1)
         az = round(altaz.az.to_value(u.deg), 1)
@@ -113,16 +191,7 @@ def altaz_for_object(name, location, observing_time):
     except Exception as e:
         alt, az, next_rise_str = None, None, "N/A"
 
-    if alt is None:
-        status = "⚠️ Unknown"
-    elif alt < 30:
-        status = "🔻 Not visible (below 30°)"
-    elif az < 180:
-        status = "⬆️ Rising"
-    else:
-        status = "⬇️ Setting"
-
-    return alt, az, status, next_rise_str
+    return alt, az, target_status(alt, az), next_rise_str
 
 
 def moon_emoji_from_illum(illum):
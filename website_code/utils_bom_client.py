@@ -0,0 +1,155 @@
+import asyncio
+import atexit
+import json
+import os
+import re
+import threading
+from email.utils import formatdate
+
+import aiohttp
+
+BOM_URL = "http://www.bom.gov.au/fwo/IDV60801/IDV60801.{station_id}.json"
+BOM_CACHE_DIR = "/home/ingo/WHOPA/bom_cache"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36"
+}
+
+# The newest observation comes first in the "data" list, so its timestamp is
+# the first match in the raw body and can be read without parsing the JSON
+LATEST_TIME_PATTERN = re.compile(rb'"local_date_time_full"\s*:\s*"(\d{14})"')
+
+
+class BomStationClient:
+    """
+    Client for the BoM station observation JSONs.
+
+    One aiohttp session (and its connection pool) lives on a private event
+    loop thread for the lifetime of the client. Requests are conditional
+    (If-None-Match / If-Modified-Since), responses are stored in
+    ``cache_dir`` so they survive restarts, and a body is only parsed again
+    when its latest ``local_date_time_full`` advanced.
+
+    ``base_url`` can point at a local server with fixture files for testing.
+    """
+
+    def __init__(self, base_url=BOM_URL, cache_dir=BOM_CACHE_DIR, timeout=20):
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._meta = {}  # station_id -> {"etag", "last_modified", "latest"}
+        self._data = {}  # station_id -> parsed JSON of the latest body
+        self._session = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bom-client",
+                                        daemon=True)
+        self._thread.start()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _body_path(self, station_id):
+        return os.path.join(self.cache_dir, f"IDV60801.{station_id}.json")
+
+    def _meta_path(self, station_id):
+        return os.path.join(self.cache_dir, f"IDV60801.{station_id}.meta.json")
+
+    def _load_cached(self, station_id):
+        """Loads meta data and body of a station from disk (once)."""
+        if station_id in self._meta or not self.cache_dir:
+            return
+        try:
+            with open(self._meta_path(station_id)) as f:
+                meta = json.load(f)
+            with open(self._body_path(station_id), "rb") as f:
+                self._data[station_id] = json.loads(f.read())
+            self._meta[station_id] = meta
+        except (OSError, ValueError):
+            self._meta[station_id] = {}
+
+    def _store(self, station_id, body, meta):
+        if not self.cache_dir:
+            return
+        try:
+            for path, content in [(self._body_path(station_id), body),
+                                  (self._meta_path(station_id), json.dumps(meta).encode())]:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(content)
+                os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"❌ Could not cache BoM data for {station_id}: {e}")
+
+    async def _fetch(self, station_id):
+        """Returns (station_id, data, updated)."""
+        self._load_cached(station_id)
+        meta = self._meta[station_id]
+
+        headers = dict(HEADERS)
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            url = self.base_url.format(station_id=station_id)
+            async with self._session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    return station_id, self._data.get(station_id), False
+                response.raise_for_status()
+                body = await response.read()
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified") or formatdate(usegmt=True)
+        except Exception as e:
+            print(f"Error fetching {station_id}: {e}")
+            return station_id, self._data.get(station_id), False
+
+        match = LATEST_TIME_PATTERN.search(body)
+        latest = match.group(1).decode() if match else None
+        updated = latest is None or latest != meta.get("latest") or station_id not in self._data
+        if updated:
+            try:
+                self._data[station_id] = json.loads(body)
+            except ValueError as e:
+                print(f"Invalid JSON from {station_id}: {e}")
+                return station_id, self._data.get(station_id), False
+
+        meta = {"etag": etag, "last_modified": last_modified, "latest": latest}
+        if updated or meta != self._meta[station_id]:
+            self._meta[station_id] = meta
+            self._store(station_id, body, meta)
+        return station_id, self._data[station_id], updated
+
+    async def _fetch_all(self, station_ids):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return await asyncio.gather(*(self._fetch(sid) for sid in station_ids))
+
+    def fetch_all(self, station_ids):
+        """
+        Fetches all stations concurrently. Returns a list of
+        (station_id, data, updated) where ``data`` is None if a station has
+        never been fetched successfully and ``updated`` tells whether it has
+        a newer observation than last time.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(station_ids), self._loop)
+        return future.result(timeout=self.timeout * 2)
+
+    def close(self):
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(self.timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_bom_client():
+    """The shared BomStationClient."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = BomStationClient()
+            atexit.register(_client.close)
+        return _client
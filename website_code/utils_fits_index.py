@@ -0,0 +1,295 @@
+from datetime import datetime, timedelta
+import mmap
+import os
+import sqlite3
+import threading
+
+import pytz
+
+FITS_INDEX_DB = "/home/ingo/WHOPA/fits_index.sqlite"
+
+FITS_EXTENSIONS = (".fits", ".fit")
+FITS_BLOCK = 2880  # bytes, headers are padded to whole blocks
+FITS_CARD = 80
+MAX_HEADER_BLOCKS = 64  # give up on files without an END card in the first 180 kB
+UPDATE_BATCH = 500  # rows written per transaction
+
+MELB_TZ = pytz.timezone("Australia/Melbourne")
+
+# Header keyword -> column
+HEADER_COLUMNS = {
+    "DATE-OBS": "date_obs",
+    "EXPTIME": "exptime",
+    "GAIN": "gain",
+    "RA": "ra",
+    "DEC": "dec",
+    "FILTER": "filter",
+    "NAXIS1": "naxis1",
+    "NAXIS2": "naxis2",
+    "OBJECT": "object",
+    "STACKCNT": "stackcnt",
+}
+
+COLUMNS = ("path", "target", "night", "size", "mtime") + tuple(HEADER_COLUMNS.values())
+
+
+def _card_value(card):
+    """Value of an 80-character header card: str, bool, int, float or None."""
+    if card[8:10] != "= ":
+        return None
+    value = card[10:].strip()
+    if value.startswith("'"):
+        # Strings are quoted, with '' for a literal quote, and may contain "/"
+        chars, i = [], 1
+        while i < len(value):
+            if value[i] == "'":
+                if value[i + 1:i + 2] != "'":
+                    break
+                i += 1
+            chars.append(value[i])
+            i += 1
+        return "".join(chars).rstrip()
+
+    value = value.split("/", 1)[0].strip()
+    if value in ("T", "F"):
+        return value == "T"
+    for cast in (int, lambda v: float(v.replace("D", "E"))):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return None
+
+
+def parse_header(data):
+    """
+    {keyword: value} of the HEADER_COLUMNS keywords in the primary header at
+    the start of ``data`` (bytes-like), or None if it is not a FITS header.
+    """
+    if bytes(data[:9]) != b"SIMPLE  =":
+        return None
+    values = {}
+    limit = min(len(data), MAX_HEADER_BLOCKS * FITS_BLOCK)
+    for start in range(0, limit - FITS_CARD + 1, FITS_CARD):
+        card = bytes(data[start:start + FITS_CARD]).decode("ascii", "replace")
+        keyword = card[:8].rstrip()
+        if keyword == "END":
+            return values
+        if keyword in HEADER_COLUMNS:
+            values[keyword] = _card_value(card)
+    return None
+
+
+def read_primary_header(path):
+    """
+    Reads the primary header of a FITS file through a memory map of its
+    first MAX_HEADER_BLOCKS blocks. Parsing stops at END, so only the pages
+    holding the header are actually read from disk, never the data.
+    """
+    with open(path, "rb") as f:
+        length = min(os.fstat(f.fileno()).st_size, MAX_HEADER_BLOCKS * FITS_BLOCK)
+        if length < FITS_BLOCK:
+            return None
+        with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ) as data:
+            return parse_header(data)
+
+
+def parse_date_obs(value):
+    """DATE-OBS (UTC) -> aware datetime, or None. Fractions beyond microseconds are dropped."""
+    if not isinstance(value, str) or not value:
+        return None
+    date_str, _, fraction = value.rstrip("Z").partition(".")
+    try:
+        dt = datetime.fromisoformat(date_str)
+    except ValueError:
+        return None
+    if fraction.isdigit():
+        dt += timedelta(microseconds=int(fraction[:6].ljust(6, "0")))
+    return pytz.utc.localize(dt) if dt.tzinfo is None else dt
+
+
+def night_of(dt):
+    """Observing night (local date of the evening) of an aware datetime: local times before noon count to the day before."""
+    local = dt.astimezone(MELB_TZ)
+    if local.hour < 12:
+        local -= timedelta(days=1)
+    return local.date().isoformat()
+
+
+def header_row(root, rel_path, size=None, mtime=None, header=None):
+    """A row of the headers table for ``rel_path`` below ``root``, reading the header unless given."""
+    abs_path = os.path.join(root, rel_path)
+    if size is None or mtime is None:
+        st = os.stat(abs_path)
+        size, mtime = st.st_size, st.st_mtime
+    if header is None:
+        header = read_primary_header(abs_path)
+    header = header or {}
+
+    date_obs = parse_date_obs(header.get("DATE-OBS"))
+    row = {
+        "path": rel_path,
+        "target": rel_path.split("/", 1)[0] if "/" in rel_path else None,
+        "night": night_of(date_obs) if date_obs else None,
+        "size": size,
+        "mtime": mtime,
+    }
+    for keyword, column in HEADER_COLUMNS.items():
+        value = header.get(keyword)
+        if column in ("date_obs", "filter", "object"):
+            value = value if isinstance(value, str) and value else None
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = None
+        row[column] = value
+    if date_obs:
+        row["date_obs"] = date_obs.astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    return tuple(row[column] for column in COLUMNS)
+
+
+def header_rows(root, entries):
+    """header_row() of every (relative path, size, mtime) in ``entries``, skipping unreadable files."""
+    rows = []
+    for rel_path, size, mtime in entries:
+        try:
+            rows.append(header_row(root, rel_path, size, mtime))
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not read header of {rel_path}: {e}")
+    return rows
+
+
+def iter_fits_files(root):
+    """Yields (relative path, size, mtime) of every FITS file below ``root``."""
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(rel_path)
+                    elif entry.name.lower().endswith(FITS_EXTENSIONS) and entry.is_file():
+                        st = entry.stat()
+                        yield rel_path, st.st_size, st.st_mtime
+        except OSError as e:
+            print(f"❌ Could not list {os.path.join(root, rel_dir)}: {e}")
+
+
+class FitsHeaderIndex:
+    """
+    SQLite table of the primary-header keywords of every FITS file in the
+    archive (see HEADER_COLUMNS), plus the top-level folder ("target") and
+    the observing night derived from DATE-OBS.
+
+    ``update`` only reads the headers of files that are new or whose size
+    or mtime changed, and forgets files that were removed. Only the header
+    blocks are read, never the pixel data.
+    """
+
+    def __init__(self, root, path=FITS_INDEX_DB):
+        self.root = root
+        self.path = path
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS headers ("
+                               "path TEXT PRIMARY KEY, target TEXT, night TEXT, size INTEGER, mtime REAL, "
+                               "date_obs TEXT, exptime REAL, gain REAL, ra REAL, dec REAL, filter TEXT, "
+                               "naxis1 INTEGER, naxis2 INTEGER, object TEXT, stackcnt INTEGER)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS headers_target_night ON headers (target, night)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS headers_night ON headers (night)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS headers_date_obs ON headers (date_obs)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS headers_filter ON headers (filter, exptime)")
+
+    def known(self):
+        """{path: (size, mtime)} of every indexed file."""
+        with self._lock:
+            return {row[0]: row[1:] for row in self._conn.execute("SELECT path, size, mtime FROM headers")}
+
+    def add(self, rows):
+        """Inserts or replaces header_row() tuples."""
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO headers ({', '.join(COLUMNS)}) "
+                                   f"VALUES ({placeholders})", rows)
+
+    def remove(self, paths):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM headers WHERE path = ?", [(path,) for path in paths])
+
+    def update(self):
+        """Indexes new and changed FITS files and drops removed ones. Returns (indexed, removed)."""
+        with self._update_lock:
+            known = self.known()
+            seen = set()
+            rows = []
+            indexed = 0
+            for rel_path, size, mtime in iter_fits_files(self.root):
+                seen.add(rel_path)
+                if known.get(rel_path) == (size, mtime):
+                    continue
+                try:
+                    rows.append(header_row(self.root, rel_path, size, mtime))
+                except OSError as e:
+                    print(f"❌ Could not read header of {rel_path}: {e}")
+                    continue
+                indexed += 1
+                if len(rows) >= UPDATE_BATCH:
+                    self.add(rows)
+                    rows = []
+            self.add(rows)
+            removed = set(known) - seen
+            self.remove(removed)
+            return indexed, len(removed)
+
+    def integration(self, target=None, night_from=None, night_to=None, filter_name=None):
+        """
+        Total exposure per target and night as [{target, night, filter,
+        frames, exptime}] (exptime in seconds), newest night first. Stacked
+        images (STACKCNT > 1) are left out so they don't count twice.
+        """
+        where, params = ["night IS NOT NULL", "exptime IS NOT NULL", "(stackcnt IS NULL OR stackcnt <= 1)"], []
+        for clause, value in (("target = ?", target), ("night >= ?", night_from),
+                              ("night <= ?", night_to), ("filter = ?", filter_name)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT target, night, filter, COUNT(*), SUM(exptime) FROM headers "
+                f"WHERE {' AND '.join(where)} GROUP BY target, night, filter "
+                "ORDER BY night DESC, target, filter", params).fetchall()
+        return [{"target": target, "night": night, "filter": filt, "frames": frames, "exptime": exptime}
+                for target, night, filt, frames, exptime in rows]
+
+    def query(self, target=None, night=None, start=None, end=None, min_exptime=None, max_exptime=None,
+              filter_name=None, limit=1000):
+        """Indexed files matching all given criteria (``start``/``end`` are UTC ISO times), ordered by DATE-OBS."""
+        where, params = [], []
+        for clause, value in (("target = ?", target), ("night = ?", night),
+                              ("date_obs >= ?", start), ("date_obs < ?", end),
+                              ("exptime >= ?", min_exptime), ("exptime <= ?", max_exptime),
+                              ("filter = ?", filter_name)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM headers"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY date_obs LIMIT ?", params + [limit]).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_fits_index(root):
+    """The shared FitsHeaderIndex of the archive at ``root``."""
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = FitsHeaderIndex(root)
+        return _indexes[root]
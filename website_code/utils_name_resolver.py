@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+
+from astropy.coordinates import SkyCoord
+from astropy.coordinates.name_resolve import NameResolveError
+from astropy import units as u
+
+from utils_ngc_catalog import get_catalog, normalize_name
+
+NAME_CACHE_PATH = "/home/ingo/WHOPA/object_name_cache.json"
+NEGATIVE_CACHE_SECONDS = 24 * 3600  # don't ask Sesame again about unknown names for a day
+
+# Objects outside NGC/IC that we want to resolve without internet: name -> (RA, Dec) in deg
+BUILTIN_OBJECTS = {
+    "Large Magellanic Cloud": (80.8942, -69.7561),
+    "LMC": (80.8942, -69.7561),
+    "Small Magellanic Cloud": (13.1867, -72.8286),
+    "SMC": (13.1867, -72.8286),
+    "Sgr A*": (266.4168, -29.0078),
+}
+
+
+class NameResolver:
+    """
+    Resolves object names to SkyCoords, offline first.
+
+    Lookup order: the on-disk cache, the built-in objects, the bundled
+    NGC.csv catalogue (names, Messier numbers, identifiers and common names)
+    and only then Sesame (online). Online results are written to the
+    cache, and names Sesame does not know are cached as misses for
+    NEGATIVE_CACHE_SECONDS so a typo is not looked up on every request.
+    """
+
+    def __init__(self, cache_path=NAME_CACHE_PATH, catalog=None, online=True):
+        self.cache_path = cache_path
+        self.catalog = catalog
+        self.online = online
+        self._builtin = {normalize_name(n): c for n, c in BUILTIN_OBJECTS.items()}
+        self._lock = threading.Lock()
+        self._cache = {}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"❌ Ignoring unreadable name cache {cache_path}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._cache, f, indent=1)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"❌ Could not write name cache {self.cache_path}: {e}")
+
+    def _lookup_offline(self, key):
+        if key in self._builtin:
+            return self._builtin[key]
+        catalog = self.catalog if self.catalog is not None else get_catalog()
+        idx = catalog.lookup(key)
+        if idx is None:
+            return None
+        return catalog.ra[idx], catalog.dec[idx]
+
+    def resolve(self, name):
+        """Returns the ICRS SkyCoord of ``name`` or raises ValueError."""
+        key = normalize_name(name)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry.get("ra") is not None:
+                    return SkyCoord(entry["ra"] * u.deg, entry["dec"] * u.deg, frame="icrs")
+                if time.time() - entry["checked"] < NEGATIVE_CACHE_SECONDS:
+                    raise ValueError(f"❌ Could not find object: '{name}'")
+
+            coords = self._lookup_offline(key)
+        if coords is not None:
+            return SkyCoord(coords[0] * u.deg, coords[1] * u.deg, frame="icrs")
+
+        if not self.online:
+            raise ValueError(f"❌ Could not find object: '{name}'")
+
+        try:
+            coord = SkyCoord.from_name(name).icrs
+        except NameResolveError as e:
+            # Either unknown to Sesame or Sesame unreachable - only cache the former
+            if "Unable to find coordinates" in str(e):
+                with self._lock:
+                    self._cache[key] = {"name": name, "ra": None, "checked": time.time()}
+                    self._save_cache()
+            raise ValueError(f"❌ Could not find object: '{name}'") from e
+
+        with self._lock:
+            self._cache[key] = {"name": name, "ra": coord.ra.deg, "dec": coord.dec.deg,
+                                "checked": time.time()}
+            self._save_cache()
+        return coord
+
+
+_resolver = None
+
+
+def resolve_object(name):
+    """Resolves ``name`` with the shared NameResolver (see NameResolver.resolve)."""
+    global _resolver
+    if _resolver is None:
+        _resolver = NameResolver()
+    return _resolver.resolve(name)
@@ -0,0 +1,149 @@
+import csv
+import os
+import re
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+NGC_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "NGC.csv")
+
+
+def normalize_name(name):
+    """
+    Canonical lookup key for an object name, e.g.
+    "M 42" -> "M42", "NGC 0224" -> "NGC224", "Orion Nebula" -> "ORIONNEBULA"
+    """
+    key = re.sub(r"[\s_]+", "", name).upper()
+    match = re.match(r"^(NGC|IC|M)0*(\d+)(.*)$", key)
+    if match:
+        key = "".join(match.groups())
+    return key
+
+
+def _sexagesimal_to_deg(value, hours=False):
+    sign = -1 if value.startswith("-") else 1
+    d, m, s = (float(part) for part in value.lstrip("+-").split(":"))
+    deg = sign * (d + m / 60 + s / 3600)
+    return deg * 15 if hours else deg
+
+
+def _float_or_nan(value):
+    return float(value) if value else np.nan
+
+
+def radec_to_xyz(ra_deg, dec_deg):
+    """Unit vectors (..., 3) for RA/Dec in degrees."""
+    ra = np.deg2rad(ra_deg)
+    dec = np.deg2rad(dec_deg)
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+class NGCCatalog:
+    """
+    The OpenNGC catalogue from NGC.csv, held as NumPy arrays.
+
+    Positions are stored as unit vectors in a KD-tree, so cone searches are
+    a single tree query on chord distance. Names, Messier numbers, NGC/IC
+    cross-references, identifiers and common names are indexed in a dict.
+    Rows without coordinates are skipped.
+
+    Arrays: name, type, ra, dec (deg), xyz, vmag, bmag, majax, minax
+    (arcmin), surfbr (mag/arcsec^2), messier (0 if none), common_names.
+    """
+
+    def __init__(self, csv_path=NGC_CSV_PATH):
+        rows = []
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f, delimiter=";"):
+                if row["RA"] and row["Dec"]:
+                    rows.append(row)
+
+        self.name = np.array([row["Name"] for row in rows])
+        self.type = np.array([row["Type"] for row in rows])
+        self.ra = np.array([_sexagesimal_to_deg(row["RA"], hours=True) for row in rows])
+        self.dec = np.array([_sexagesimal_to_deg(row["Dec"]) for row in rows])
+        self.xyz = radec_to_xyz(self.ra, self.dec)
+        self.vmag = np.array([_float_or_nan(row["V-Mag"]) for row in rows])
+        self.bmag = np.array([_float_or_nan(row["B-Mag"]) for row in rows])
+        self.majax = np.array([_float_or_nan(row["MajAx"]) for row in rows])
+        self.minax = np.array([_float_or_nan(row["MinAx"]) for row in rows])
+        self.surfbr = np.array([_float_or_nan(row["SurfBr"]) for row in rows])
+        self.messier = np.array([int(row["M"]) if row["M"] else 0 for row in rows])
+        self.common_names = [row["Common names"] for row in rows]
+
+        self._tree = cKDTree(self.xyz)
+        self._names = self._build_name_index(rows)
+
+    def __len__(self):
+        return len(self.name)
+
+    def _build_name_index(self, rows):
+        names = {}
+        for i, row in enumerate(rows):
+            names.setdefault(normalize_name(row["Name"]), i)
+
+        # Aliases, with real objects taking precedence over "Dup" entries
+        for i in sorted(range(len(rows)), key=lambda i: rows[i]["Type"] == "Dup"):
+            row = rows[i]
+            aliases = []
+            if row["M"]:
+                aliases.append("M" + row["M"])
+            if row["NGC"]:
+                aliases.append("NGC" + row["NGC"])
+            if row["IC"]:
+                aliases.append("IC" + row["IC"])
+            aliases += [a for a in row["Identifiers"].split(",") if a]
+            aliases += [a for a in row["Common names"].split(",") if a]
+            for alias in aliases:
+                names.setdefault(normalize_name(alias), i)
+        return names
+
+    @property
+    def mag(self):
+        """V magnitude, falling back to B where V is missing."""
+        return np.where(np.isnan(self.vmag), self.bmag, self.vmag)
+
+    def lookup(self, name):
+        """Row index of ``name`` (any indexed alias), or None."""
+        return self._names.get(normalize_name(name))
+
+    def select(self, max_mag=None, types=None, exclude_types=("Dup", "NonEx")):
+        """Boolean mask of objects brighter than ``max_mag`` and of the given types."""
+        mask = np.ones(len(self), dtype=bool)
+        if max_mag is not None:
+            mask &= self.mag <= max_mag
+        if types is not None:
+            mask &= np.isin(self.type, list(types))
+        if exclude_types:
+            mask &= ~np.isin(self.type, list(exclude_types))
+        return mask
+
+    def cone_search(self, ra_deg, dec_deg, radius_deg, max_mag=None, types=None,
+                    exclude_types=("Dup", "NonEx")):
+        """
+        Objects within ``radius_deg`` of (RA, Dec), nearest first.
+        Returns (indices, separations in deg).
+        """
+        centre = radec_to_xyz(ra_deg, dec_deg)
+        chord = 2 * np.sin(np.deg2rad(min(radius_deg, 180)) / 2)
+        idx = np.array(self._tree.query_ball_point(centre, chord), dtype=int)
+
+        if len(idx):
+            idx = idx[self.select(max_mag, types, exclude_types)[idx]]
+        sep = np.rad2deg(2 * np.arcsin(np.clip(np.linalg.norm(self.xyz[idx] - centre, axis=1) / 2, 0, 1)))
+        order = np.argsort(sep)
+        return idx[order], sep[order]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """The shared NGCCatalog, parsed from NGC.csv on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = NGCCatalog()
+        return _catalog
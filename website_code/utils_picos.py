@@ -1,11 +1,337 @@
 from sys import argv
-import subprocess
+import atexit
 import math
+import threading
+import time
 from datetime import datetime
 
+import serial
+
 PICO_ADDR = "/dev/ttyACM"
 SWITCH_PORT = 0
 SENSOR_PORT = 1
+PICO_BAUDRATE = 115200
+PICO_TIMEOUT = 5
+STREAM_RATE = 5  # Hz, frames per second sent by pico_sensors_stream.py
+STREAM_MAX_AGE = 2  # seconds before a streamed frame counts as stale
+ACTUATOR_LOG = "/home/ingo/WHOPA/actuator_log.txt"
+
+# Sent ahead of every script call. The Pico keeps the script sources in RAM,
+# so they are only read from its filesystem the first time they are needed
+# (or again after a soft reset, e.g. when a script raises SystemExit).
+PICO_BOOTSTRAP = """
+try:
+    _whopa_src
+except NameError:
+    _whopa_scripts = {}
+    def _whopa_src(name):
+        if name not in _whopa_scripts:
+            with open(name) as f:
+                _whopa_scripts[name] = f.read()
+        return _whopa_scripts[name]
+"""
+
+
+class PicoError(Exception):
+    """Raised when the Pico reports an exception or stops responding."""
+
+
+class PicoSession:
+    """
+    Long-lived raw-REPL session to one Pico over USB serial.
+
+    The port is opened once and the Pico is kept in raw REPL mode, so each
+    request is a single write/read round trip instead of a new mpremote
+    process. Requests from several threads are serialised by a lock.
+    """
+
+    def __init__(self, device, baudrate=PICO_BAUDRATE, timeout=PICO_TIMEOUT):
+        self.device = device
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self._serial = None
+        self._lock = threading.Lock()
+
+    def _read_until(self, ending, timeout):
+        self._serial.timeout = timeout
+        data = self._serial.read_until(ending)
+        if not data.endswith(ending):
+            self._close()  # The REPL is in an unknown state, start afresh next time
+            raise PicoError(f"Timed out waiting for {ending!r} from {self.device}")
+        return data
+
+    def _open(self):
+        self._serial = serial.Serial(self.device, self.baudrate,
+                                     timeout=self.timeout, exclusive=True)
+        # Interrupt whatever is running, then enter raw REPL (Ctrl-A)
+        self._serial.write(b"\r\x03\x03")
+        time.sleep(0.1)
+        self._serial.reset_input_buffer()
+        self._serial.write(b"\r\x01")
+        self._read_until(b"raw REPL; CTRL-B to exit\r\n>", self.timeout)
+
+    def _send_code(self, code):
+        # Write in small chunks like mpremote does, the Pico's USB input buffer is tiny
+        data = code.encode()
+        for i in range(0, len(data), 256):
+            self._serial.write(data[i:i + 256])
+            time.sleep(0.01)
+        self._serial.write(b"\x04")
+        if self._serial.read(2) != b"OK":
+            self._close()
+            raise PicoError(f"Pico on {self.device} did not accept the command")
+
+    def _exec_raw(self, code, timeout):
+        self._send_code(code)
+        output = self._read_until(b"\x04", timeout)[:-1]
+        error = self._read_until(b"\x04", timeout)[:-1]
+        self._read_until(b">", timeout)
+        if error:
+            raise PicoError(error.decode(errors="replace").strip())
+        return output.decode(errors="replace")
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._serial is not None:
+            try:
+                self._serial.write(b"\r\x02")  # Leave raw REPL (Ctrl-B)
+                self._serial.close()
+            except (serial.SerialException, OSError):
+                pass
+        self._serial = None
+
+    def exec(self, code, timeout=None):
+        """
+        Executes a snippet of MicroPython on the Pico and returns its stdout.
+        Reconnects once if the serial link was lost (e.g. Pico replugged).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._serial is None:
+                        self._open()
+                    return self._exec_raw(code, timeout)
+                except (serial.SerialException, OSError):
+                    self._close()
+                    if attempt:
+                        raise
+
+    def run_script(self, script, timeout=None, **variables):
+        """Runs a script stored on the Pico with the given global variables set."""
+        assignments = "".join(f"{k}={v!r}\n" for k, v in variables.items())
+        code = f"{PICO_BOOTSTRAP}{assignments}exec(_whopa_src({script!r}))"
+        return self.exec(code, timeout=timeout)
+
+    def stream_script(self, script, stop, **variables):
+        """
+        Starts a never-ending script on the Pico and yields its raw output as
+        it arrives, until the ``stop`` event is set. The script is then
+        interrupted with Ctrl-C and the session returns to the raw REPL.
+        The session is locked for as long as the script is streaming.
+        """
+        assignments = "".join(f"{k}={v!r}\n" for k, v in variables.items())
+        code = f"{PICO_BOOTSTRAP}{assignments}exec(_whopa_src({script!r}))"
+        with self._lock:
+            if self._serial is None:
+                self._open()
+            self._send_code(code)
+            try:
+                self._serial.timeout = 0.5
+                while not stop.is_set():
+                    data = self._serial.read(max(1, self._serial.in_waiting))
+                    if b"\x04" in data:
+                        # The script ended on its own, most likely with an exception
+                        output = data.split(b"\x04", 1)[0]
+                        if output:
+                            yield output
+                        self._close()
+                        raise PicoError(f"{script} stopped streaming on {self.device}")
+                    if data:
+                        yield data
+            finally:
+                if self._serial is not None:
+                    self._serial.write(b"\x03")
+                    self._read_until(b"\x04>", self.timeout)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_pico_session(port):
+    """Returns the shared PicoSession for /dev/ttyACM<port>, creating it on first use."""
+    with _sessions_lock:
+        if port not in _sessions:
+            _sessions[port] = PicoSession(PICO_ADDR + str(port))
+        return _sessions[port]
+
+
+def parse_sensor_frame(line):
+    """
+    Parses one "$S,seq=..,key=value,...*CS" frame from pico_sensors_stream.py.
+    Returns (seq, values) or None if the frame is incomplete or corrupt.
+    """
+    if not line.startswith("$") or "*" not in line:
+        return None
+    body, _, checksum = line[1:].rpartition("*")
+    calculated = 0
+    for ch in body:
+        calculated ^= ord(ch)
+    try:
+        if int(checksum, 16) != calculated:
+            return None
+    except ValueError:
+        return None
+
+    kind, _, fields = body.partition(",")
+    if kind != "S":
+        return None
+    values = dict(item.split("=", 1) for item in fields.split(",") if "=" in item)
+    try:
+        seq = int(values.pop("seq"))
+    except (KeyError, ValueError):
+        return None
+    values.pop("ms", None)
+    return seq, values
+
+
+class SensorFrameParser:
+    """Splits the raw byte stream from the Pico into sensor frames incrementally."""
+
+    def __init__(self):
+        self._buffer = b""
+
+    def feed(self, data):
+        """Adds new bytes and returns the list of complete (seq, values) frames."""
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        frames = []
+        for line in lines:
+            frame = parse_sensor_frame(line.decode(errors="replace").strip())
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+
+class PicoSensorStream:
+    """
+    Keeps pico_sensors_stream.py running on the sensor Pico and holds the
+    latest frame in memory. While it runs, get_sensor_values answers from
+    the latest frame instead of querying the Pico.
+    """
+
+    def __init__(self, port=SENSOR_PORT, rate=STREAM_RATE):
+        self.port = port
+        self.rate = rate
+        self.frames = 0
+        self.dropped = 0
+        self._latest = None
+        self._last_seq = None
+        self._stale = False  # a stale-stream warning was printed and no frame came since
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"sensor-stream-{self.port}",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=PICO_TIMEOUT)
+
+    def _run(self):
+        session = get_pico_session(self.port)
+        last_error = None
+        while not self._stop.is_set():
+            parser = SensorFrameParser()
+            try:
+                for chunk in session.stream_script("pico_sensors_stream.py", self._stop,
+                                                   rate=self.rate):
+                    for seq, values in parser.feed(chunk):
+                        self._add_frame(seq, values)
+                        last_error = None
+            except Exception as e:
+                # Reported once per outage, not on every reconnect attempt
+                if str(e) != last_error:
+                    print("❌ Sensor stream interrupted:", e)
+                    last_error = str(e)
+                self._stop.wait(PICO_TIMEOUT)
+
+    def _add_frame(self, seq, values):
+        with self._lock:
+            if self._last_seq is not None and seq > self._last_seq + 1:
+                self.dropped += seq - self._last_seq - 1
+            self._last_seq = seq
+            self.frames += 1
+            self._latest = (time.time(), values)
+            self._stale = False
+
+    def latest(self, max_age=None):
+        """Returns the values of the newest frame, or None if there is none (recent enough)."""
+        with self._lock:
+            if self._latest is None:
+                return None
+            timestamp, values = self._latest
+        if max_age is not None and time.time() - timestamp > max_age:
+            return None
+        return values
+
+    def report_stale(self):
+        """True the first time it is called since the last frame, so a dead stream is reported once."""
+        with self._lock:
+            reported, self._stale = self._stale, True
+        return not reported
+
+
+_streams = {}
+
+
+def start_sensor_stream(port=SENSOR_PORT, rate=STREAM_RATE):
+    """Starts (or returns the running) PicoSensorStream for the given port."""
+    with _sessions_lock:
+        if port not in _streams:
+            _streams[port] = PicoSensorStream(port=port, rate=rate)
+        stream = _streams[port]
+    stream.start()
+    return stream
+
+
+@atexit.register
+def close_pico_sessions():
+    with _sessions_lock:
+        streams = list(_streams.values())
+        _streams.clear()
+    for stream in streams:
+        stream.stop()
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def log_actuator_command(device, action, path=ACTUATOR_LOG):
+    """Appends actuator commands to the log other processes (e.g. the resident watchdog) follow."""
+    if device.lower() != "actuator":
+        return
+    with open(path, "a") as f:
+        f.write(f"{datetime.now().isoformat()} {action}\n")
+
+
+_switch_listeners = []
+
+
+def add_switch_listener(callback):
+    """Registers ``callback(device, action)``, called after every command set_switch_device_action sent."""
+    _switch_listeners.append(callback)
 
 
 def set_switch_device_action(device, action, port=SWITCH_PORT):
@@ -40,40 +366,32 @@ def set_switch_device_action(device, action, port=SWITCH_PORT):
 
     print(f"Sending command: {device} → {action}")
 
-    cmd = [
-        "mpremote", "connect", PICO_ADDR+str(port),
-        "exec", f"device='{device}'; action='{action}'; exec(open('pico_switches_action.py').read())"
-    ]
-
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print(result.stdout.strip())
-
-        def log_actuator_command(device, action):
-            if device.lower() != "actuator":
-                return
-            with open("/home/ingo/WHOPA/actuator_log.txt", "a") as f:
-                f.write(f"{datetime.now().isoformat()} {action}\n")
+        output = get_pico_session(port).run_script("pico_switches_action.py",
+                                                   device=device, action=action)
+        print(output.strip())
+    except (PicoError, serial.SerialException, OSError) as e:
+        print("❌ Error running command:")
+        print(e)
+        return False
 
+    # The Pico carried out the command: a failed log write must not hide that from the listeners
+    try:
         log_actuator_command(device, action)
+    except OSError as e:
+        print("⚠️ Could not write the actuator log:", e)
 
-    except subprocess.CalledProcessError as e:
-        print("❌ Error running command:")
-        print(e.stderr or e.output)
+    for callback in _switch_listeners:
+        try:
+            callback(device, action)
+        except Exception as e:
+            print("❌ Error in switch listener:", e)
+    return True
 
 
 def get_switch_gpio_status(port=SWITCH_PORT):
     try:
-        result = subprocess.run(
-            [
-                "mpremote", "connect", PICO_ADDR+str(port),
-                "exec", "exec(open('pico_switches_status.py').read())"
-            ],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        output = result.stdout.strip()
+        output = get_pico_session(port).run_script("pico_switches_status.py").strip()
 
         # Example: "15=0,26=1,27=0,28=1,29=0"
         pairs = output.split(",")
@@ -87,33 +405,36 @@ def get_switch_gpio_status(port=SWITCH_PORT):
                     gpio_status[int(gpio)] = val  # in case of "ERR"
         return gpio_status
 
-    except subprocess.CalledProcessError as e:
+    except (PicoError, serial.SerialException, OSError) as e:
         print("❌ Failed to get GPIO status:")
-        print(e.stderr or e.output)
+        print(e)
         return {}
 
 
 def get_sensor_values(sensor_name=None, port=SENSOR_PORT):
     """
-    Executes pico_sensors.py via mpremote, optionally filtering for one sensor.
+    Executes pico_sensors_status.py over the persistent Pico session,
+    optionally filtering for one sensor.
     Returns a dictionary of key=value pairs.
+
+    If a sensor stream is running on the port, the latest streamed frame is
+    used instead and the Pico is not queried at all.
     """
-    try:
-        # Build the exec command
-        port_addr = PICO_ADDR + str(port)
+    stream = _streams.get(port)
+    if stream is not None:
+        # The stream holds the port, so there is no falling back to a query
+        values = stream.latest(max_age=STREAM_MAX_AGE)
+        if values is None:
+            if stream.report_stale():
+                print("❌ No recent frame from the sensor stream.")
+            return {}
         if sensor_name:
-            cmd = [
-                "mpremote", "connect", port_addr,
-                "exec", f"sensor='{sensor_name}'; exec(open('pico_sensors_status.py').read())"
-            ]
-        else:
-            cmd = [
-                "mpremote", "connect", port_addr,
-                "exec", "exec(open('pico_sensors_status.py').read())"
-            ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-        output = result.stdout.strip()
+            return {k: v for k, v in values.items() if sensor_name.lower() in k}
+        return dict(values)
+
+    try:
+        output = get_pico_session(port).run_script("pico_sensors_status.py",
+                                                   sensor=sensor_name).strip()
 
         # Handle 'NA' or empty result
         if not output or output == "NA":
@@ -122,8 +443,8 @@ def get_sensor_values(sensor_name=None, port=SENSOR_PORT):
         # Parse key=value pairs
         return dict(item.split("=") for item in output.split(",") if "=" in item)
 
-    except subprocess.TimeoutExpired:
-        print("❌ Sensor read timed out.")
+    except PicoError as e:
+        print("❌ Sensor read failed:", e)
         return {}
     except Exception as e:
         print("❌ Error reading sensor:", e)
@@ -1,19 +1,55 @@
 import os
 import re
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 from datetime import datetime, timedelta
 from tqdm import tqdm
+
+from utils_sync_manifest import get_sync_manifest, PART_SUFFIX
 from time import sleep
+import time
 
 SMB_SHARE = "//seestar/EMMC Images"
 ROOT_FOLDER = "MyWorks"
 
+SYNC_WORKERS = 4  # folders downloaded concurrently, each over its own smbclient session
+SYNC_RETRIES = 3  # extra attempts for files that did not arrive complete
+SYNC_BACKOFF = 2  # seconds before the first retry, doubled for every further one
+
+# e.g. "getting file \\MyWorks\\M 42\\x.fit of size 4159680 as /archive/M 42/x.fit.part
+#       (5234.1 KiloBytes/sec) (average 5234.1 KiloBytes/sec)"
+GET_LINE_PATTERN = re.compile(r"^getting file (?P<remote>.+) of size (?P<size>\d+) as (?P<local>.+?)"
+                              r"(?: \((?P<rate>[\d.]+) Ki?loBytes/sec\).*)?$")
+
+
+# One entry of an smbclient listing, e.g.
+#   "  Light_M 42_10.0s_IRCUT_20250429-232613.fit      A  4159680  Tue Apr 29 23:26:13 2025"
+# Names may contain spaces; the attribute letters, size and date are fixed columns at the end.
+LS_LINE_PATTERN = re.compile(r"^\s+(?P<name>.+?)\s+(?P<attr>[A-Z]*)\s+(?P<size>\d+)\s+"
+                             r"(?P<date>\w{3} \w{3}\s+\d{1,2} \d\d:\d\d:\d\d \d{4})\s*$")
+
+SKIPPED_FOLDERS = (".", "..", "System Volume Information")
+
 
-def run_smb_ls(path):
-    cmd = ["smbclient", SMB_SHARE, "-N", "-c", f"cd {path}; ls"]
+def run_smb_ls(path, recursive=False):
+    commands = f'cd "{path}"; recurse ON; ls' if recursive else f'cd "{path}"; ls'
+    cmd = ["smbclient", SMB_SHARE, "-N", "-c", commands]
     result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    return result.stdout.strip().splitlines()
+    return result.stdout.strip("\n").splitlines()
+
+
+def parse_ls_line(line):
+    """Returns (name, is_folder, size, date string) for a listing entry, or None for other lines."""
+    match = LS_LINE_PATTERN.match(line)
+    if not match:
+        return None
+    try:
+        dt = datetime.strptime(" ".join(match["date"].split()), "%a %b %d %H:%M:%S %Y")
+    except ValueError:
+        return None
+    return match["name"], "D" in match["attr"], int(match["size"]), dt.strftime("%Y-%m-%d %H:%M:%S")
 
 
 def parse_ls_output(lines):
@@ -21,26 +57,54 @@ def parse_ls_output(lines):
     folders = []
 
     for line in lines:
-        parts = line.strip().split()
-        if len(parts) < 8:
-            continue  # not enough data to parse
-
-        name = parts[0]
-        date_str = " ".join(parts[-5:])  # Last 5 parts: 'Thu May  1 22:27:38 2025'
-
-        try:
-            dt = datetime.strptime(date_str, "%a %b %d %H:%M:%S %Y")
-        except ValueError:
+        entry = parse_ls_line(line)
+        if entry is None:
             continue
+        name, is_folder, size, date = entry
 
-        if parts[1] == "D":
+        if is_folder:
             folders.append(name)
         else:
-            files.append({"name": name, "date": dt.strftime("%Y-%m-%d %H:%M:%S")})
+            files.append({"name": name, "date": date, "size": size})
 
     return folders, files
 
 
+def parse_recursive_ls_output(lines, root=ROOT_FOLDER):
+    """
+    Parses the output of ``recurse ON; ls`` run in ``root`` into the nested
+    {"files": [...], "subfolders": {...}} structure of crawl_folder, for the
+    root folder itself. Each subfolder's listing is preceded by its path
+    from the share root, e.g. "\\MyWorks\\M 42\\sub".
+    """
+    tree = {"files": [], "subfolders": {}}
+    node = tree
+    root_parts = [part for part in root.replace("/", "\\").split("\\") if part]
+
+    for line in lines:
+        if line.startswith("\\"):
+            parts = [part for part in line.strip().split("\\") if part]
+            if parts[:len(root_parts)] != root_parts:
+                node = None  # outside of root, ignore
+                continue
+            node = tree
+            for part in parts[len(root_parts):]:
+                node = node["subfolders"].setdefault(part, {"files": [], "subfolders": {}})
+            continue
+
+        entry = parse_ls_line(line)
+        if entry is None or node is None:
+            continue
+        name, is_folder, size, date = entry
+        if is_folder:
+            if name not in (".", ".."):
+                node["subfolders"].setdefault(name, {"files": [], "subfolders": {}})
+        else:
+            node["files"].append({"name": name, "date": date, "size": size})
+
+    return tree
+
+
 def crawl_folder(path, verbose=False):
     try:
         output = run_smb_ls(path)
@@ -69,20 +133,23 @@ def crawl_folder(path, verbose=False):
 
 
 def crawl_seestar():
+    """
+    Lists the whole MyWorks tree in one recursive smbclient session and
+    returns {target folder: {"files": [...], "subfolders": {...}}}.
+    """
     try:
-        # List top-level folders under MyWorks
-        top_level_output = run_smb_ls("MyWorks")
-        folder_names, _ = parse_ls_output(top_level_output)
-
-        all_data = {}
-
-        for folder in folder_names:
-            if folder in [".", "..", "System Volume Information"]:
-                continue
-            full_path = f"MyWorks/{folder}"
-            all_data[folder] = crawl_folder(full_path)
+        try:
+            lines = run_smb_ls(ROOT_FOLDER, recursive=True)
+        except subprocess.CalledProcessError as e:
+            # Unreadable folders (e.g. access denied) fail the run but the rest is still listed
+            if not e.stdout:
+                print(f"❌ Error crawling seestar folders: {e.stderr or e.stdout}")
+                return {}
+            lines = e.stdout.strip("\n").splitlines()
 
-        return all_data
+        tree = parse_recursive_ls_output(lines)
+        return {folder: content for folder, content in tree["subfolders"].items()
+                if folder not in SKIPPED_FOLDERS}
 
     except Exception as e:
         print("❌ Error crawling seestar folders:", e)
@@ -92,7 +159,8 @@ def crawl_seestar():
 def get_targets_with_recent_fits(crawl_data, hours=12):
     """Return top-level targets with .fits files newer than N hours ago."""
 
-    cutoff = datetime.now() - timedelta(hours=hours)
+    # The crawl dates are "%Y-%m-%d %H:%M:%S" strings, which sort chronologically
+    cutoff = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
     recent_targets = []
 
     for target, content in crawl_data.items():
@@ -101,8 +169,7 @@ def get_targets_with_recent_fits(crawl_data, hours=12):
         # Top-level FITS files
         for f in content.get("files", []):
             if f["name"].lower().endswith((".fits", ".fit")):
-                dt = datetime.strptime(f["date"], "%Y-%m-%d %H:%M:%S")
-                if dt > cutoff:
+                if f["date"] > cutoff:
                     has_recent = True
                     break
 
@@ -111,8 +178,7 @@ def get_targets_with_recent_fits(crawl_data, hours=12):
             for subfolder, subcontent in content.get("subfolders", {}).items():
                 for f in subcontent.get("files", []):
                     if f["name"].lower().endswith((".fits", ".fit")):
-                        dt = datetime.strptime(f["date"], "%Y-%m-%d %H:%M:%S")
-                        if dt > cutoff:
+                        if f["date"] > cutoff:
                             has_recent = True
                             break
                 if has_recent:
@@ -159,49 +225,145 @@ def _sync_folder(parent_path, current_folder, content, dest_root):
         _sync_folder(remote_path, subfolder_name, subfolder_content, local_path)
 
 
-def sync_fits_files_to_local(crawl_data, dest_root):
-    # First count how many files we'll download
-    download_list = []
-
-    for top_folder, content in crawl_data.items():
-        _gather_downloads("MyWorks", top_folder, content, dest_root, download_list)
-
-    # Now actually download them with a progress bar
-    with tqdm(total=len(download_list), desc="Downloading FITS files") as pbar:
-        for item in download_list:
-            remote_path, filename, local_file_path = item
-
-            try:
-                smb_cmd = [
-                    "smbclient",
-                    "//seestar/EMMC Images",
-                    "-N",
-                    "-c",
-                    f'cd "{remote_path}"; get "{filename}" "{local_file_path}"'
-                ]
-                subprocess.run(smb_cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            except subprocess.CalledProcessError:
-                tqdm.write(f"❌ Failed to download {remote_path}/{filename}")
-            pbar.update(1)
-
+def smb_get_batch(remote_path, items, on_file=None):
+    """
+    Downloads ``items`` [(filename, local_file_path, size)] from one remote
+    folder in a single smbclient session, so the share is connected and
+    authenticated once instead of once per file. The commands are fed
+    through stdin, which keeps folders with thousands of files off the
+    command line.
+
+    Each file is fetched with ``reget`` into ``local_file_path + ".part"``,
+    which continues a partial download from an earlier attempt, and is only
+    renamed into place once its size matches ``size`` from the listing.
+    ``on_file(local_file_path, size, bytes_per_second)`` is called as each
+    transfer finishes. Returns the items that are not complete.
+    """
+    parts = {local_file_path + PART_SUFFIX: local_file_path for _, local_file_path, _ in items}
+    commands = [f'cd "{remote_path}"']
+    commands += [f'reget "{filename}" "{local_file_path}{PART_SUFFIX}"' for filename, local_file_path, _ in items]
+    commands.append("exit")
+
+    proc = subprocess.Popen(["smbclient", SMB_SHARE, "-N"], stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    writer = threading.Thread(target=_write_commands, args=(proc.stdin, commands), daemon=True)
+    writer.start()
+
+    last = time.monotonic()
+    for line in proc.stdout:
+        match = GET_LINE_PATTERN.match(line.strip())
+        if not match:
+            continue
+        now = time.monotonic()
+        size = int(match["size"])
+        # smbclient's own figure when it prints one, otherwise the time since the previous file
+        rate = float(match["rate"]) * 1024 if match["rate"] else size / max(now - last, 1e-3)
+        last = now
+        if on_file is not None:
+            on_file(parts.get(match["local"], match["local"]), size, rate)
+    proc.wait()
+    writer.join()
+
+    incomplete = []
+    for filename, local_file_path, size in items:
+        part = local_file_path + PART_SUFFIX
+        try:
+            part_size = os.path.getsize(part)
+        except OSError:
+            part_size = None
+        if part_size is not None and (size is None or part_size == size):
+            os.replace(part, local_file_path)
+            continue
+        if part_size is not None and size is not None and part_size > size:
+            os.remove(part)  # not a prefix of the remote file, start over
+        incomplete.append((filename, local_file_path, size))
+    return incomplete
 
-def _gather_downloads(parent_path, current_folder, content, dest_root, download_list):
-    remote_path = f"{parent_path}/{current_folder}"
-    local_path = os.path.join(dest_root, current_folder)
 
-    os.makedirs(local_path, exist_ok=True)
+def _write_commands(stdin, commands):
+    try:
+        for command in commands:
+            stdin.write(command + "\n")
+        stdin.close()
+    except (BrokenPipeError, OSError):
+        pass  # smbclient gave up, the missing files are reported by the caller
 
-    for f in content.get("files", []):
-        filename = f["name"]
-        if not filename.lower().endswith((".fits", ".fit")):
-            continue
 
-        local_file_path = os.path.join(local_path, filename)
-        if not os.path.exists(local_file_path):
-            download_list.append((remote_path, filename, local_file_path))
+def smb_get_with_retries(remote_path, items, on_file=None, retries=SYNC_RETRIES, backoff=SYNC_BACKOFF):
+    """smb_get_batch, retrying the incomplete files with exponential backoff. Returns those still incomplete."""
+    for attempt in range(retries + 1):
+        try:
+            items = smb_get_batch(remote_path, items, on_file)
+        except OSError as e:
+            print(f"❌ Failed to run smbclient for {remote_path}: {e}")
+        if not items or attempt == retries:
+            break
+        time.sleep(backoff * 2 ** attempt)
+    return items
+
+
+def sync_fits_files_to_local(crawl_data, dest_root, workers=SYNC_WORKERS, manifest=None):
+    """
+    Records ``crawl_data`` in the sync manifest and downloads every FITS
+    file that is new, changed on the Seestar or missing / truncated locally,
+    including files left pending by an earlier, interrupted sync.
+    Returns the [(remote_path, local_path)] that could not be downloaded.
+    """
+    manifest = manifest or get_sync_manifest()
+    manifest.update_from_crawl(crawl_data, dest_root, parent_path=ROOT_FOLDER)
+    return download_pending(manifest, workers)
+
+
+def resume_sync(workers=SYNC_WORKERS, manifest=None):
+    """Downloads the files left pending by an interrupted sync, without crawling the share."""
+    return download_pending(manifest or get_sync_manifest(), workers)
+
+
+def download_pending(manifest, workers=SYNC_WORKERS):
+    pending = manifest.pending()
+    if not pending:
+        return []
+
+    # One smbclient session per folder, several folders at a time
+    by_folder = defaultdict(list)
+    expected = {}
+    for remote_path, local_file_path, size in pending:
+        remote_dir, filename = remote_path.rsplit("/", 1)
+        by_folder[remote_dir].append((filename, local_file_path, size))
+        expected[local_file_path] = (remote_path, size)
+        os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
+
+    rates = {}
+    failed = []
+    with tqdm(total=len(expected), desc="Downloading FITS files", unit="file") as pbar:
+
+        def on_file(local_file_path, size, rate):
+            rates[local_file_path] = rate
+            pbar.set_postfix_str(f"{rate / 1e6:.1f} MB/s")
+            pbar.update(1)
 
-    for subfolder_name, subfolder_content in content.get("subfolders", {}).items():
-        _gather_downloads(remote_path, subfolder_name, subfolder_content, local_path, download_list)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(smb_get_with_retries, remote_dir, items, on_file): remote_dir
+                       for remote_dir, items in by_folder.items()}
+            for future in as_completed(futures):
+                remote_dir = futures[future]
+                future.result()
+
+                # Only files with the size seen in the crawl count as synced
+                for filename, local_file_path, _ in by_folder[remote_dir]:
+                    remote_path, size = expected[local_file_path]
+                    if not manifest.verify(remote_path, local_file_path, size,
+                                           rate=rates.get(local_file_path)):
+                        tqdm.write(f"❌ Failed to download {remote_path}")
+                        failed.append((remote_path, local_file_path))
+
+    if rates:
+        total = sum(size or 0 for path, (_, size) in expected.items() if path in rates)
+        slowest = min(rates, key=rates.get)
+        print(f"⬇️  {len(rates)} files, {total / 1e6:.1f} MB, "
+              f"median {sorted(rates.values())[len(rates) // 2] / 1e6:.1f} MB/s, "
+              f"slowest {os.path.basename(slowest)} at {rates[slowest] / 1e6:.2f} MB/s")
+    return failed
 
 
 def crawl_local_archive_by_night(archive_root):
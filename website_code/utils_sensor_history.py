@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SENSOR_HISTORY_DB = os.environ.get("WHOPA_SENSOR_HISTORY_DB", "/home/ingo/WHOPA/sensor_history.sqlite")
+
+# Rollup tables and their bucket sizes in seconds
+ROLLUPS = {"1m": 60, "1h": 3600}
+
+# How long each resolution is kept, in seconds (None = forever)
+RETENTION = {"raw": 7 * 86400, "1m": 90 * 86400, "1h": None}
+
+PRUNE_INTERVAL = 3600  # seconds between retention clean-ups
+
+
+def flatten_sensor_data(sensor_data):
+    """
+    Flattens get_sensor_data() output into numeric series, e.g.
+    {"DHT11": {"Temp": 21.0}, "Ball Switch": "Closed"}
+    -> {"DHT11.Temp": 21.0, "Ball Switch": 1.0}
+    Switches become 1 (closed) / 0 (open), non-numeric values are skipped.
+    """
+    flat = {}
+    for name, value in sensor_data.items():
+        if isinstance(value, dict):
+            for sub_name, sub_value in flatten_sensor_data(value).items():
+                flat[f"{name}.{sub_name}"] = sub_value
+        elif value in ("Closed", "Open"):
+            flat[name] = 1.0 if value == "Closed" else 0.0
+        else:
+            try:
+                flat[name] = float(value)
+            except (TypeError, ValueError):
+                continue
+    return flat
+
+
+class SensorHistory:
+    """
+    Append-only SQLite store for sensor time series.
+
+    Every sample is written to the raw table and folded into 1-minute and
+    1-hour min/max/mean rollups as it arrives, so long time ranges are read
+    from a few hundred rollup rows instead of millions of raw samples.
+    Old rows are pruned according to RETENTION.
+    """
+
+    def __init__(self, path=SENSOR_HISTORY_DB, retention=RETENTION):
+        self.path = path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._last_prune = 0
+        self._conn = None
+
+    def _db(self):
+        """The connection, opened (and the tables created) on first use. Call with the lock held."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS samples "
+                             "(key TEXT, ts REAL, value REAL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS samples_key_ts ON samples (key, ts)")
+                for name in ROLLUPS:
+                    conn.execute(f"CREATE TABLE IF NOT EXISTS rollup_{name} "
+                                 "(key TEXT, bucket INTEGER, n INTEGER, "
+                                 "vmin REAL, vmax REAL, vsum REAL, "
+                                 "PRIMARY KEY (key, bucket)) WITHOUT ROWID")
+            self._conn = conn
+        return self._conn
+
+    def append(self, values, timestamp=None):
+        """Stores one sample per key. ``values`` is a {key: float} dict."""
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(key, timestamp, float(value)) for key, value in values.items()]
+        if not rows:
+            return
+
+        with self._lock, self._db():
+            self._conn.executemany("INSERT INTO samples (key, ts, value) VALUES (?, ?, ?)", rows)
+            for name, size in ROLLUPS.items():
+                bucket = int(timestamp // size)
+                self._conn.executemany(
+                    f"INSERT INTO rollup_{name} (key, bucket, n, vmin, vmax, vsum) "
+                    "VALUES (?, ?, 1, ?, ?, ?) "
+                    "ON CONFLICT (key, bucket) DO UPDATE SET "
+                    "n = n + 1, vmin = min(vmin, excluded.vmin), "
+                    "vmax = max(vmax, excluded.vmax), vsum = vsum + excluded.vsum",
+                    [(key, bucket, value, value, value) for key, _, value in rows])
+
+        if timestamp - self._last_prune > PRUNE_INTERVAL:
+            self.prune(now=timestamp)
+
+    def record_snapshot(self, snapshot):
+        """
+        StatePoller listener: stores the sensor part of a state snapshot.
+        Readings the Pico did not deliver are None and are left out, so a
+        failed read does not end up in the history as zeros.
+        """
+        self.append(flatten_sensor_data(snapshot["sensors"]), snapshot["timestamp"])
+
+    def prune(self, now=None):
+        """Deletes rows older than the retention period of each resolution."""
+        now = time.time() if now is None else now
+        with self._lock, self._db():
+            if self.retention.get("raw") is not None:
+                self._conn.execute("DELETE FROM samples WHERE ts < ?",
+                                   (now - self.retention["raw"],))
+            for name, size in ROLLUPS.items():
+                if self.retention.get(name) is not None:
+                    self._conn.execute(f"DELETE FROM rollup_{name} WHERE bucket < ?",
+                                       (int((now - self.retention[name]) // size),))
+        self._last_prune = now
+
+    def keys(self):
+        with self._lock:
+            rows = self._db().execute("SELECT DISTINCT key FROM rollup_1h").fetchall()
+        return sorted(row[0] for row in rows)
+
+    def query(self, key, start=None, end=None, resolution="auto"):
+        """
+        Returns the series for ``key`` between ``start`` and ``end`` (unix
+        times, default: the last 24 hours) as a dict of NumPy arrays
+        "time", "mean", "min" and "max". ``resolution`` is "raw", "1m", "1h"
+        or "auto", which picks the finest one that stays below ~2000 points.
+        Rollup times are the start of each bucket.
+        """
+        end = time.time() if end is None else end
+        start = end - 86400 if start is None else start
+
+        if resolution == "auto":
+            span = end - start
+            if span <= 1800:  # ~1 Hz samples
+                resolution = "raw"
+            elif span <= 2000 * ROLLUPS["1m"]:
+                resolution = "1m"
+            else:
+                resolution = "1h"
+
+        with self._lock:
+            if resolution == "raw":
+                rows = self._db().execute(
+                    "SELECT ts, value, value, value FROM samples "
+                    "WHERE key = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                    (key, start, end)).fetchall()
+            elif resolution in ROLLUPS:
+                size = ROLLUPS[resolution]
+                rows = self._db().execute(
+                    f"SELECT bucket * {size}, vsum / n, vmin, vmax FROM rollup_{resolution} "
+                    "WHERE key = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+                    (key, int(start // size), int(end // size))).fetchall()
+            else:
+                raise ValueError(f"Unknown resolution: '{resolution}'")
+
+        data = np.array(rows, dtype=float).reshape(-1, 4)
+        return {
+            "time": data[:, 0],
+            "mean": data[:, 1],
+            "min": data[:, 2],
+            "max": data[:, 3],
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,11 +1,14 @@
 # seestar_sync.py
 
-from utils_seestar_data_access import crawl_seestar, get_targets_with_recent_fits, sync_fits_files_to_local
+from utils_fits_index import get_fits_index
+from utils_seestar_data_access import (crawl_seestar, get_targets_with_recent_fits, resume_sync,
+                                       sync_fits_files_to_local)
+from utils_sync_manifest import get_sync_manifest
 
 ARCHIVE_PATH = "/media/ingo/archive"
 HOURS_LOOKBACK = 2  # Sync only files from the last 6 hours
 
-def main():
+def sync_recent():
     print("🔍 Crawling Seestar share...")
     crawl_data = crawl_seestar()
     if not crawl_data:
@@ -21,5 +24,24 @@ def main():
     print(f"📁 Syncing: {', '.join(filtered.keys())}")
     sync_fits_files_to_local(filtered, ARCHIVE_PATH)
 
+
+def main():
+    # Downloads an interrupted run left pending (incl. .part files) come first, even if
+    # the Seestar is unreachable now or has nothing recent
+    manifest = get_sync_manifest()
+    pending = len(manifest.pending())
+    if pending:
+        print(f"⏯️  Resuming {pending} pending downloads...")
+        resume_sync(manifest=manifest)
+
+    sync_recent()
+
+    hashed = manifest.fill_checksums()
+    if hashed:
+        print(f"🔐 Checksummed {hashed} previously synced files")
+    indexed, removed = get_fits_index(ARCHIVE_PATH).update()
+    print(f"🗂️  FITS header index: {indexed} indexed, {removed} removed")
+
+
 if __name__ == "__main__":
     main()
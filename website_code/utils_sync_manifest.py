@@ -0,0 +1,166 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SYNC_MANIFEST_DB = "/home/ingo/WHOPA/seestar_sync.sqlite"
+
+FITS_EXTENSIONS = (".fits", ".fit")
+PART_SUFFIX = ".part"  # downloads in progress, renamed once complete
+CHECKSUM_BATCH = 200  # files hashed per fill_checksums() call
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def iter_crawl_files(crawl_data, parent_path, dest_root):
+    """
+    Yields (target, remote_dir, file entry, local_dir) for every file of a
+    crawl_seestar() result, with the local folders mirroring the remote ones.
+    """
+    def walk(target, remote_dir, content, local_dir):
+        for f in content.get("files", []):
+            yield target, remote_dir, f, local_dir
+        for name, sub_content in content.get("subfolders", {}).items():
+            yield from walk(target, f"{remote_dir}/{name}", sub_content, os.path.join(local_dir, name))
+
+    for target, content in crawl_data.items():
+        yield from walk(target, f"{parent_path}/{target}", content, os.path.join(dest_root, target))
+
+
+class SyncManifest:
+    """
+    SQLite record of every Seestar FITS file: remote path, size and mtime
+    from the crawl, where it goes locally, and the status and checksum of
+    the local copy.
+
+    A sync compares the crawl against the manifest and only files that are
+    new, changed on the Seestar, or missing / truncated locally become
+    "pending". Pending rows survive an interrupted sync, so the next run can
+    pick them up without crawling the share again.
+    """
+
+    def __init__(self, path=SYNC_MANIFEST_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS files ("
+                               "remote_path TEXT PRIMARY KEY, target TEXT, local_path TEXT, "
+                               "size INTEGER, mtime TEXT, status TEXT, checksum TEXT, "
+                               "attempts INTEGER DEFAULT 0, synced_at REAL, rate REAL)")
+            if "rate" not in {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}:
+                self._conn.execute("ALTER TABLE files ADD COLUMN rate REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_status ON files (status)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime)")
+
+    def update_from_crawl(self, crawl_data, dest_root, parent_path="MyWorks"):
+        """Records a crawl and marks new or changed FITS files as pending. Returns the number pending."""
+        with self._lock:
+            known = {row[0]: row[1:] for row in self._conn.execute(
+                "SELECT remote_path, size, mtime, status FROM files")}
+
+        rows = []
+        for target, remote_dir, f, local_dir in iter_crawl_files(crawl_data, parent_path, dest_root):
+            if not f["name"].lower().endswith(FITS_EXTENSIONS):
+                continue
+            remote_path = f"{remote_dir}/{f['name']}"
+            local_path = os.path.join(local_dir, f["name"])
+            size = f.get("size")
+            try:
+                local_size = os.path.getsize(local_path)
+            except OSError:
+                local_size = None
+
+            previous = known.get(remote_path)
+            if previous is not None and previous[:2] == (size, f["date"]):
+                if previous[2] != "done" or local_size == size or (size is None and local_size is not None):
+                    continue  # unchanged: already synced, or already pending
+                status, checksum = "pending", None  # local copy deleted or truncated
+            elif previous is None and local_size is not None and (size is None or local_size == size):
+                # Synced before the manifest existed: seeded from size alone, hashed later by fill_checksums()
+                status, checksum = "done", None
+            else:
+                status, checksum = "pending", None
+                if previous is not None and os.path.exists(local_path + PART_SUFFIX):
+                    os.remove(local_path + PART_SUFFIX)  # partial download of the old version
+            rows.append((remote_path, target, local_path, size, f["date"], status, checksum,
+                         time.time() if status == "done" else None))
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO files (remote_path, target, local_path, size, mtime, status, checksum, "
+                "attempts, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT (remote_path) DO UPDATE SET target = excluded.target, "
+                "local_path = excluded.local_path, size = excluded.size, mtime = excluded.mtime, "
+                "status = excluded.status, checksum = excluded.checksum, attempts = 0, "
+                "synced_at = excluded.synced_at", rows)
+            return self._conn.execute("SELECT COUNT(*) FROM files WHERE status = 'pending'").fetchone()[0]
+
+    def pending(self):
+        """[(remote_path, local_path, size)] of every file still to download."""
+        with self._lock:
+            return self._conn.execute("SELECT remote_path, local_path, size FROM files "
+                                      "WHERE status = 'pending' ORDER BY remote_path").fetchall()
+
+    def verify(self, remote_path, local_path, size, rate=None):
+        """
+        Checks a downloaded file against the expected size and marks it done
+        (with its checksum and transfer ``rate`` in bytes/s) or leaves it
+        pending. Returns True if it is complete.
+        """
+        try:
+            local_size = os.path.getsize(local_path)
+        except OSError:
+            local_size = None
+        complete = local_size is not None and (size is None or local_size == size)
+        checksum = file_checksum(local_path) if complete else None
+
+        with self._lock, self._conn:
+            if complete:
+                self._conn.execute("UPDATE files SET status = 'done', checksum = ?, synced_at = ?, rate = ? "
+                                   "WHERE remote_path = ?", (checksum, time.time(), rate, remote_path))
+            else:
+                self._conn.execute("UPDATE files SET attempts = attempts + 1 WHERE remote_path = ?",
+                                   (remote_path,))
+        return complete
+
+    def fill_checksums(self, limit=CHECKSUM_BATCH):
+        """
+        Hashes up to ``limit`` synced files that have no checksum yet (those
+        seeded from an existing archive), so the first sync does not have to
+        read the whole archive. Returns the number hashed.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT remote_path, local_path FROM files "
+                                      "WHERE status = 'done' AND checksum IS NULL LIMIT ?",
+                                      (limit,)).fetchall()
+        hashed = []
+        for remote_path, local_path in rows:
+            try:
+                hashed.append((file_checksum(local_path), remote_path))
+            except OSError as e:
+                print(f"❌ Could not hash {local_path}: {e}")
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE files SET checksum = ? WHERE remote_path = ?", hashed)
+        return len(hashed)
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_sync_manifest():
+    """The shared SyncManifest."""
+    global _manifest
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = SyncManifest()
+        return _manifest
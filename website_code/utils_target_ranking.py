@@ -0,0 +1,130 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from utils_astro import get_night_ephemeris, MELB_TZ, WHOPA_LOCATION
+from utils_ngc_catalog import get_catalog, radec_to_xyz
+from utils_visibility import altitudes, precess_to_date
+
+MIN_ALTITUDE = 30  # deg
+DARK_SUN_ALTITUDE = -18  # deg, astronomical darkness
+
+# Seestar S50 field of view in arcmin
+SEESTAR_FOV = (77.4, 43.8)
+
+# Not worth a Seestar session (single stars, asterisms, duplicates, ...)
+EXCLUDED_TYPES = ("Dup", "NonEx", "*", "**", "*Ass", "Other")
+
+
+def _size_factor(majax):
+    """Peaks when the object fills ~40% of the short side of the field of view."""
+    fill = majax / SEESTAR_FOV[1]
+    factor = np.exp(-0.5 * (np.log10(fill / 0.4) / 0.5) ** 2)
+    return np.where(np.isnan(majax), 0.1, factor)
+
+
+def _surface_brightness(catalog, mag):
+    """Catalogue SurfBr where given, else estimated from magnitude and size (mag/arcsec^2)."""
+    minax = np.where(np.isnan(catalog.minax), catalog.majax, catalog.minax)
+    area = np.pi / 4 * catalog.majax * minax * 3600
+    estimate = mag + 2.5 * np.log10(np.where(area > 0, area, np.nan))
+    return np.where(np.isnan(catalog.surfbr), estimate, catalog.surfbr)
+
+
+class TonightsTargets:
+    """
+    Scores every catalogue object for one night:
+
+        score = hours above MIN_ALTITUDE in darkness (capped at 6)
+                x moon factor (illumination, moon up-time and separation)
+                x size factor (object size versus the Seestar field of view)
+                x surface-brightness factor
+
+    All objects are scored at once with NumPy on the night's 5-minute grid.
+    """
+
+    def __init__(self, ephem, catalog):
+        self.night_start = ephem.start
+        self.catalog = catalog
+
+        in_night = ephem.unix < ephem.unix[0] + 24 * 3600
+        dark = in_night & (ephem.sun_alt < DARK_SUN_ALTITUDE)
+        dark_idx = np.nonzero(dark)[0]
+        self.dark_start = datetime.fromtimestamp(ephem.unix[dark_idx[0]], MELB_TZ) if len(dark_idx) else None
+        self.dark_end = datetime.fromtimestamp(ephem.unix[dark_idx[-1]], MELB_TZ) if len(dark_idx) else None
+
+        mag = catalog.mag
+        candidates = np.nonzero(catalog.select(exclude_types=EXCLUDED_TYPES) & ~np.isnan(mag))[0]
+        self.index = candidates
+        self.score = np.zeros(len(candidates))
+        self.hours_above = np.zeros(len(candidates))
+        self.moon_separation = np.full(len(candidates), np.nan)
+        self.best_time = np.full(len(candidates), np.nan)
+        if not len(dark_idx) or not len(candidates):
+            return
+
+        times = ephem.unix[dark_idx]
+        step_hours = (ephem.unix[1] - ephem.unix[0]) / 3600
+        ra, dec = precess_to_date(catalog.ra[candidates], catalog.dec[candidates], times.mean())
+        lat = WHOPA_LOCATION.lat.deg
+        lon = WHOPA_LOCATION.lon.deg
+        alt = altitudes(ra[:, None], dec[:, None], times[None, :], lat, lon)
+
+        self.hours_above = (alt >= MIN_ALTITUDE).sum(axis=1) * step_hours
+        self.best_time = times[np.argmax(alt, axis=1)]
+
+        # Moon at the middle of the dark period
+        mid = dark_idx[len(dark_idx) // 2]
+        moon_xyz = radec_to_xyz(ephem.moon.ra.deg[mid], ephem.moon.dec.deg[mid])
+        cos_sep = np.clip(catalog.xyz[candidates] @ moon_xyz, -1, 1)
+        self.moon_separation = np.rad2deg(np.arccos(cos_sep))
+        moon_up = np.mean(ephem.moon_alt[dark_idx] > 0)
+        illum = ephem.moon_illum[mid] / 100
+        moon_factor = 1 - illum * moon_up * np.clip(1 - self.moon_separation / 90, 0, 1)
+
+        sb = _surface_brightness(catalog, mag)[candidates]
+        sb_factor = np.where(np.isnan(sb), 0.3, np.clip((24.5 - sb) / 4, 0.05, 1))
+
+        self.score = (np.minimum(self.hours_above, 6) / 6 * moon_factor
+                      * _size_factor(catalog.majax[candidates]) * sb_factor)
+
+    def top(self, limit=20):
+        """The ``limit`` best targets as a list of JSON-friendly dicts."""
+        order = np.argsort(-self.score)[:limit]
+        order = order[self.score[order] > 0]
+
+        def number(value, digits=1):
+            return None if np.isnan(value) else round(float(value), digits)
+
+        targets = []
+        for i in order:
+            idx = self.index[i]
+            messier = int(self.catalog.messier[idx])
+            targets.append({
+                "name": str(self.catalog.name[idx]),
+                "messier": f"M{messier}" if messier else None,
+                "common_name": self.catalog.common_names[idx].split(",")[0] or None,
+                "type": str(self.catalog.type[idx]),
+                "mag": number(self.catalog.mag[idx]),
+                "size_arcmin": number(self.catalog.majax[idx]),
+                "hours_above": number(self.hours_above[i]),
+                "moon_separation": number(self.moon_separation[i], 0),
+                "best_time": datetime.fromtimestamp(self.best_time[i], MELB_TZ).strftime("%H:%M"),
+                "score": number(self.score[i], 3),
+            })
+        return targets
+
+
+_ranking = None
+_ranking_lock = threading.Lock()
+
+
+def get_tonights_targets(limit=20):
+    """Best targets for the current night, ranked once per night and cached."""
+    global _ranking
+    ephem = get_night_ephemeris()
+    with _ranking_lock:
+        if _ranking is None or _ranking.night_start != ephem.start:
+            _ranking = TonightsTargets(ephem, get_catalog())
+        return _ranking.top(limit)
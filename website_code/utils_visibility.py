@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+WHOPA_LAT = -37.30303
+WHOPA_LON = 144.41624
+
+SIDEREAL_RATE = 360.98564736629  # degrees of sidereal rotation per solar day
+
+
+def unix_to_jd(unix_times):
+    return np.asarray(unix_times) / 86400.0 + 2440587.5
+
+
+def gmst_deg(unix_times):
+    """Greenwich mean sidereal time in degrees (IAU 1982, ~0.1 s accuracy)."""
+    d = unix_to_jd(unix_times) - 2451545.0
+    t = d / 36525.0
+    return (280.46061837 + SIDEREAL_RATE * d + 0.000387933 * t**2 - t**3 / 38710000.0) % 360
+
+
+def precess_to_date(ra_deg, dec_deg, unix_time):
+    """
+    First-order precession of J2000 RA/Dec to the epoch of ``unix_time``.
+    Good to a few arcseconds over decades except within a degree of the poles.
+    """
+    years = (unix_to_jd(unix_time) - 2451545.0) / 365.25
+    m = 3.07496 * 15 / 3600 * years  # deg
+    n = 1.33621 * 15 / 3600 * years  # deg
+    ra = np.deg2rad(ra_deg)
+    dec = np.deg2rad(dec_deg)
+    ra_date = ra_deg + m + n * np.sin(ra) * np.tan(dec)
+    dec_date = dec_deg + n * np.cos(ra)
+    return ra_date, dec_date
+
+
+def altitudes(ra_deg, dec_deg, unix_times, lat_deg=WHOPA_LAT, lon_deg=WHOPA_LON):
+    """
+    Geometric altitude in degrees (no refraction) from the hour angle.
+    ``ra_deg``/``dec_deg`` and ``unix_times`` broadcast against each other,
+    e.g. targets of shape (N, 1, 1) with times of shape (M, T) give (N, M, T).
+    """
+    hour_angle = np.deg2rad(gmst_deg(unix_times) + lon_deg - ra_deg)
+    lat = np.deg2rad(lat_deg)
+    dec = np.deg2rad(dec_deg)
+    sin_alt = np.sin(lat) * np.sin(dec) + np.cos(lat) * np.cos(dec) * np.cos(hour_angle)
+    return np.rad2deg(np.arcsin(np.clip(sin_alt, -1, 1)))
+
+
+def night_grid(dates, hours, lon_deg=WHOPA_LON, utc_offset_hours=None):
+    """
+    Unix times of shape (len(dates), len(hours)) for local clock ``hours``
+    (may run past 24 into the next morning) on each "YYYY-MM-DD" date.
+    The UTC offset defaults to local mean solar time at ``lon_deg``.
+    """
+    if utc_offset_hours is None:
+        utc_offset_hours = lon_deg / 15
+    midnights = np.array([datetime.strptime(d, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+                          for d in dates])
+    return midnights[:, None] + (np.asarray(hours)[None, :] - utc_offset_hours) * 3600
+
+
+def compute_visibility(ra_deg, dec_deg, dates, hours, min_altitude=30,
+                       lat_deg=WHOPA_LAT, lon_deg=WHOPA_LON, utc_offset_hours=None):
+    """
+    Visibility of N targets (J2000 RA/Dec in degrees) over M dates and T
+    local clock hours in one broadcast computation.
+
+    Returns a dict of arrays:
+        "times"        (M, T)    unix times of the grid
+        "altitude"     (N, M, T) altitude in degrees
+        "hours_above"  (N, M)    time spent above ``min_altitude``
+        "max_altitude" (N, M)    highest altitude inside the window
+        "transit_hour" (N, M)    local clock hour of the meridian transit,
+                                 NaN if it falls outside the window
+    Accurate to about an arcminute above ~20° altitude (no refraction,
+    nutation or aberration).
+    """
+    ra = np.atleast_1d(np.asarray(ra_deg, dtype=float))
+    dec = np.atleast_1d(np.asarray(dec_deg, dtype=float))
+    hours = np.asarray(hours, dtype=float)
+
+    times = night_grid(dates, hours, lon_deg, utc_offset_hours)
+    ra_date, dec_date = precess_to_date(ra, dec, times[:, :1].mean())
+    alt = altitudes(ra_date[:, None, None], dec_date[:, None, None], times[None], lat_deg, lon_deg)
+
+    step = hours[1] - hours[0] if len(hours) > 1 else 0.0
+    hours_above = (alt >= min_altitude).sum(axis=-1) * step
+
+    # Hours after the start of the window until the hour angle is 0
+    lst_start = gmst_deg(times[:, 0]) + lon_deg
+    delta = ((ra_date[:, None] - lst_start[None, :]) % 360) / SIDEREAL_RATE * 24
+    transit_hour = hours[0] + delta
+    transit_hour[transit_hour > hours[-1]] = np.nan
+
+    return {
+        "times": times,
+        "altitude": alt,
+        "hours_above": hours_above,
+        "max_altitude": alt.max(axis=-1),
+        "transit_hour": transit_hour,
+    }
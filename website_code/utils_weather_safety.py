@@ -0,0 +1,387 @@
+import argparse
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import yaml
+
+from utils_astro import get_night_ephemeris, night_start, NightEphemeris, MELB_TZ
+from utils_picos import get_sensor_values, set_switch_device_action, start_sensor_stream, STREAM_RATE
+from utils_sensor_history import ROLLUPS
+from utils_wind_history import get_wind_history
+
+SAFETY_YAML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "safety.yaml")
+
+# SensorHistory keys of the sensor inputs, for the simulation
+SENSOR_HISTORY_KEYS = {
+    "rain_adc": "Rain",
+    "humidity": "DHT11.Humidity",
+    "roof_open": "Ball Switch",
+}
+
+
+def load_safety_yaml(filepath=SAFETY_YAML):
+    with open(filepath, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def _number(value):
+    """float(value), or None for missing, unparsable ("ERR") or NaN values."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class SafetyRule:
+    """One threshold from safety.yaml with its trip / clear debouncing."""
+
+    def __init__(self, name, source, max=None, min=None, hysteresis=0,
+                 trip_after=0, clear_after=0, on_missing="ignore"):
+        self.name = name
+        self.source = source
+        self.max = max
+        self.min = min
+        self.hysteresis = hysteresis
+        self.trip_after = trip_after
+        self.clear_after = clear_after
+        self.on_missing = on_missing
+        self.tripped = False
+        self.missing = False  # tripped because the input was unavailable, not by the weather
+        self.value = None
+        self._bad_since = None
+        self._good_since = None
+
+    def update(self, value, now):
+        """Feeds the current input value and returns whether the rule is tripped."""
+        self.value = value
+        if value is None:
+            if self.on_missing != "trip":
+                return self.tripped
+            bad = True
+            clear = False
+        else:
+            bad = ((self.max is not None and value > self.max)
+                   or (self.min is not None and value < self.min))
+            clear = ((self.max is None or value <= self.max - self.hysteresis)
+                     and (self.min is None or value >= self.min + self.hysteresis))
+            if self.missing:
+                # Data is back: a missing-data trip ends now (or carries on as a weather trip),
+                # without waiting out the weather hysteresis
+                self.missing = False
+                if not bad:
+                    self.tripped = False
+
+        if bad:
+            self._good_since = None
+            if self._bad_since is None:
+                self._bad_since = now
+            if now - self._bad_since >= self.trip_after and not self.tripped:
+                self.tripped = True
+                self.missing = value is None
+        else:
+            self._bad_since = None
+            if not clear:
+                self._good_since = None  # inside the hysteresis band
+            else:
+                if self._good_since is None:
+                    self._good_since = now
+                if self.tripped and now - self._good_since >= self.clear_after:
+                    self.tripped = False
+        return self.tripped
+
+    def describe(self):
+        limits = " ".join(f"{label} {limit}" for label, limit in [("min", self.min), ("max", self.max)]
+                          if limit is not None)
+        value = "missing" if self.value is None else round(self.value, 1)
+        return f"{self.name}: {self.source}={value} ({limits})"
+
+
+class SafetyEngine:
+    """
+    Closes the roof when the weather turns.
+
+    Every ``interval`` seconds the rain ADC, humidity, the interpolated WHOPA
+    wind (from the BoM wind history) and the sun altitude are checked against
+    the rules in safety.yaml. When a rule trips and the ball switch does not
+    report the roof as closed, ``Actuator → retract`` is sent. It is only
+    repeated (every ``retry_after`` seconds) while the ball switch positively
+    reads open; with the roof state unknown it is sent once per unsafe spell.
+
+    ``evaluate`` is independent of where the inputs come from, so
+    ``simulate`` can replay recorded sensor data through the same rules
+    without touching the hardware.
+    """
+
+    def __init__(self, config=None, act=set_switch_device_action, stream_rate=None, verbose=True):
+        config = load_safety_yaml() if config is None else config
+        self.config = config
+        self.interval = config.get("interval", 1.0)
+        self.sensor_max_age = config.get("sensor_max_age", 10)
+        self.wind_refresh = config.get("wind_refresh", 60)
+        self.wind_trend_hours = config.get("wind_trend_hours", 3)
+        self.retry_after = config.get("retry_after", 45)
+        self.rules = [SafetyRule(name, **rule) for name, rule in config["rules"].items()]
+        self.act = act
+        self.stream_rate = stream_rate
+        self.verbose = verbose
+
+        self.events = deque(maxlen=200)
+        self._safe = True
+        self._last_command = None
+        self._inputs = {}
+        self._last_evaluation = None
+        self._sensors = {}
+        self._sensors_time = None
+        self._started = None
+        self._wind = {}
+        self._wind_time = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _read_sensors(self, now):
+        raw = get_sensor_values()
+        if raw:
+            self._sensors = raw
+            self._sensors_time = now
+        if self._sensors_time is None:
+            if self._started is None:
+                self._started = now
+            if now - self._started <= self.sensor_max_age:
+                return {}  # no frame yet since start-up: not "missing" until sensor_max_age has passed
+            return {"rain_adc": None, "humidity": None, "roof_open": None}
+        if now - self._sensors_time > self.sensor_max_age:
+            return {"rain_adc": None, "humidity": None, "roof_open": None}
+        ball = self._sensors.get("ball")
+        return {
+            "rain_adc": _number(self._sensors.get("rain")),
+            "humidity": _number(self._sensors.get("hum")),
+            "roof_open": None if ball not in ("0", "1") else ball == "1",
+        }
+
+    def _read_wind(self, now):
+        if now - self._wind_time >= self.wind_refresh:
+            self._wind_time = now
+            try:
+                self._wind = get_wind_history().site_trend(hours=self.wind_trend_hours)
+            except Exception as e:
+                print("❌ Error reading the wind history:", e)
+                self._wind = {}
+        return {
+            "wind_speed": _number(self._wind.get("speed")),
+            "wind_gust": _number(self._wind.get("gust")),
+            "gust_trend": _number(self._wind.get("gust_slope")),
+        }
+
+    def read_inputs(self, now=None):
+        now = time.time() if now is None else now
+        inputs = self._read_sensors(now)
+        inputs.update(self._read_wind(now))
+        try:
+            when = datetime.fromtimestamp(now, MELB_TZ)
+            ephem = get_night_ephemeris(when)
+            inputs["sun_altitude"] = ephem.value_at(ephem.sun_alt, when)
+        except Exception as e:
+            print("❌ Error computing the sun altitude:", e)
+            inputs["sun_altitude"] = None
+        return inputs
+
+    def evaluate(self, inputs, now=None):
+        """
+        Runs all rules on ``inputs`` (source name -> value or None) and
+        retracts the roof if needed. Returns True if it is safe to be open.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            # Rules whose source is absent from ``inputs`` (not read yet) keep their state
+            tripped = [rule for rule in self.rules
+                       if (rule.update(inputs[rule.source], now) if rule.source in inputs else rule.tripped)]
+            safe = not tripped
+            self._inputs = dict(inputs)
+            self._last_evaluation = now
+
+            if safe != self._safe:
+                self._safe = safe
+                reasons = [rule.describe() for rule in tripped]
+                self.events.append({"time": now, "event": "safe" if safe else "unsafe",
+                                    "reasons": reasons})
+                if self.verbose:
+                    print("✅ Weather safe again" if safe else "⚠️ Weather unsafe: " + "; ".join(reasons))
+                if not safe:
+                    self._last_command = None  # act straight away
+
+            roof_open = inputs.get("roof_open")
+            if safe or roof_open is False:
+                return safe
+            if self._last_command is not None:
+                # Unknown roof state: retract once per unsafe spell, only repeat while it reads open
+                if roof_open is None or now - self._last_command < self.retry_after:
+                    return safe
+            self._last_command = now
+            self.events.append({"time": now, "event": "retract",
+                                "reasons": [rule.describe() for rule in tripped]})
+
+        if self.verbose:
+            print("🛑 Closing the roof")
+        try:
+            self.act("Actuator", "retract")
+        except Exception as e:
+            print("❌ Error closing the roof:", e)
+        return safe
+
+    def start(self):
+        """Starts the evaluation thread. Calling it again is a no-op."""
+        if self.stream_rate:
+            start_sensor_stream(rate=self.stream_rate)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._started = time.time()
+                self._thread = threading.Thread(target=self._run, name="weather-safety",
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                now = time.time()
+                self.evaluate(self.read_inputs(now), now)
+            except Exception as e:
+                print("❌ Error in the weather-safety loop:", e)
+            # Fixed rate, so a slow Pico read doesn't push later checks back
+            next_tick = max(next_tick + self.interval, time.monotonic())
+            self._stop.wait(next_tick - time.monotonic())
+
+    def status(self):
+        with self._lock:
+            return {
+                "safe": self._safe,
+                "running": self._thread is not None and self._thread.is_alive(),
+                "last_evaluation": self._last_evaluation,
+                "inputs": dict(self._inputs),
+                "rules": [{"name": rule.name, "source": rule.source, "value": rule.value,
+                           "min": rule.min, "max": rule.max, "tripped": rule.tripped}
+                          for rule in self.rules],
+                "events": list(self.events)[-20:],
+            }
+
+    def simulate(self, sensor_history, start, end, step=None, resolution="raw", wind_history=None):
+        """
+        Replays recorded data from ``start`` to ``end`` (unix times) through a
+        fresh copy of the rules. Sensor inputs come from ``sensor_history``
+        (a SensorHistory, at ``resolution``), wind from the wind history and
+        the sun from the night ephemerides. Nothing is sent to the roof; the
+        returned events show what would have happened.
+        """
+        engine = SafetyEngine(self.config, act=lambda device, action: None, verbose=False)
+        engine.events = deque()  # keep every event of the replay
+        step = step or self.interval
+        grid = np.arange(start, end, step)
+
+        # Samples older than this count as missing, as in live mode
+        tolerance = self.sensor_max_age + ROLLUPS.get(resolution, 0)
+        inputs = {}
+        for source, key in SENSOR_HISTORY_KEYS.items():
+            series = sensor_history.query(key, start - tolerance, end, resolution=resolution)
+            inputs[source] = _sample_and_hold(series["time"], series["mean"], grid, tolerance)
+        roof = inputs["roof_open"]
+        inputs["roof_open"] = np.where(np.isnan(roof), np.nan, roof > 0.5)
+
+        wind_history = wind_history or get_wind_history()
+        hours = (end - start) / 3600 + self.wind_trend_hours
+        wind = wind_history.site_history(hours=hours, end=end)
+        inputs["wind_speed"] = np.interp(grid, wind["time"], wind["speed"])
+        inputs["wind_gust"] = np.interp(grid, wind["time"], wind["gust"])
+        inputs["gust_trend"] = _rolling_slope(wind["time"], wind["gust"], grid,
+                                              self.wind_trend_hours * 3600)
+        inputs["sun_altitude"] = _sun_altitudes(grid)
+
+        for i, now in enumerate(grid):
+            values = {source: _number(series[i]) for source, series in inputs.items()}
+            if values["roof_open"] is not None:
+                values["roof_open"] = bool(values["roof_open"])
+            engine.evaluate(values, now)
+        return list(engine.events)
+
+
+def _sample_and_hold(times, values, grid, tolerance):
+    """The latest sample at or before each grid time, NaN if older than ``tolerance``."""
+    if not len(times):
+        return np.full(len(grid), np.nan)
+    idx = np.searchsorted(times, grid, side="right") - 1
+    held = values[np.maximum(idx, 0)].astype(float)
+    held[(idx < 0) | (grid - times[np.maximum(idx, 0)] > tolerance)] = np.nan
+    return held
+
+
+def _rolling_slope(times, values, grid, window):
+    """Least-squares slope per hour of ``values`` over the ``window`` seconds before each grid time."""
+    ok = np.isfinite(values)
+    times, values = times[ok], values[ok]
+    slopes = np.full(len(grid), np.nan)
+    if len(times) < 3:
+        return slopes
+    # Cumulative sums give every window's regression in one pass
+    x = times / 3600
+    cx, cy = np.cumsum(np.r_[0, x]), np.cumsum(np.r_[0, values])
+    cxx, cxy = np.cumsum(np.r_[0, x * x]), np.cumsum(np.r_[0, x * values])
+    hi = np.searchsorted(times, grid, side="right")
+    lo = np.searchsorted(times, grid - window, side="left")
+    n = hi - lo
+    sx, sy = cx[hi] - cx[lo], cy[hi] - cy[lo]
+    sxx, sxy = cxx[hi] - cxx[lo], cxy[hi] - cxy[lo]
+    denom = n * sxx - sx * sx
+    good = (n >= 3) & (denom > 0)
+    slopes[good] = (n * sxy - sx * sy)[good] / denom[good]
+    return slopes
+
+
+def _sun_altitudes(grid):
+    """Sun altitude at each unix time in ``grid``, from one NightEphemeris per night."""
+    altitude = np.full(len(grid), np.nan)
+    nights = {}
+    for i, now in enumerate(grid):
+        start = night_start(datetime.fromtimestamp(now, MELB_TZ))
+        nights.setdefault(start, []).append(i)
+    for start, idx in nights.items():
+        ephem = NightEphemeris(start, targets={})
+        altitude[idx] = np.interp(grid[idx], ephem.unix, ephem.sun_alt)
+    return altitude
+
+
+# Normally the web app runs the engine next to its Pico poller (it owns the
+# serial ports). Run it on its own only when the web app is not running:
+#   $ python website_code/utils_weather_safety.py
+# or replay recorded data without touching the roof:
+#   $ python website_code/utils_weather_safety.py --simulate 2025-06-01T18:00 2025-06-02T08:00
+
+if __name__ == "__main__":
+    from utils_sensor_history import SensorHistory
+
+    parser = argparse.ArgumentParser(description="WHOPA weather-safety engine")
+    parser.add_argument("--config", default=SAFETY_YAML)
+    parser.add_argument("--simulate", nargs=2, metavar=("START", "END"),
+                        help="replay recorded data between two local ISO times")
+    parser.add_argument("--resolution", default="raw", choices=["raw"] + list(ROLLUPS))
+    args = parser.parse_args()
+
+    engine = SafetyEngine(load_safety_yaml(args.config), stream_rate=STREAM_RATE)
+    if args.simulate:
+        start, end = (MELB_TZ.localize(datetime.fromisoformat(t)).timestamp() for t in args.simulate)
+        for event in engine.simulate(SensorHistory(), start, end, resolution=args.resolution):
+            stamp = datetime.fromtimestamp(event["time"], MELB_TZ).strftime("%Y-%m-%d %H:%M:%S")
+            print(stamp, event["event"], "; ".join(event["reasons"]))
+    else:
+        engine.start()
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,286 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from plot_wind_from_bom import STATION_IDS, CENTER_LON, CENTER_LAT, COMPASS_DIRS
+from utils_wind_interp import get_station_interpolator
+
+WIND_HISTORY_DIR = "/home/ingo/WHOPA/wind_history"
+WIND_HISTORY_RETENTION = 365 * 86400  # seconds
+
+SITE_STEP = 600  # seconds between points of the interpolated site series
+MAX_SAMPLE_GAP = 2700  # don't interpolate in time across gaps longer than this (s)
+
+COLUMNS = ("time", "speed", "gust", "direction")
+
+
+def parse_observations(data):
+    """
+    All observations of a BoM station JSON as column arrays, sorted by time:
+    time (unix s), speed and gust (km/h), direction (deg, NaN for calm or
+    unknown). Returns (lon, lat, columns) or None if there is nothing usable.
+    """
+    try:
+        rows = data["observations"]["data"]
+    except (TypeError, KeyError):
+        return None
+
+    def number(value):
+        return np.nan if value is None else float(value)
+
+    times, speed, gust, direction = [], [], [], []
+    lon = lat = None
+    for obs in rows:
+        try:
+            stamp = datetime.strptime(obs["aifstime_utc"], "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+            times.append(int(stamp.timestamp()))
+            speed.append(number(obs.get("wind_spd_kmh")))
+            gust.append(number(obs.get("gust_kmh")))
+            direction.append(COMPASS_DIRS.get(str(obs.get("wind_dir", "")).upper(), np.nan))
+            lon, lat = obs["lon"], obs["lat"]
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not times:
+        return None
+
+    order = np.argsort(times)
+    columns = {
+        "time": np.asarray(times, dtype=np.int64)[order],
+        "speed": np.asarray(speed, dtype=np.float32)[order],
+        "gust": np.asarray(gust, dtype=np.float32)[order],
+        "direction": np.asarray(direction, dtype=np.float32)[order],
+    }
+    return float(lon), float(lat), columns
+
+
+class WindHistory:
+    """
+    Columnar store of the full half-hourly BoM series of every station.
+
+    Each BoM JSON carries ~3 days of observations, of which the wind map only
+    uses the newest. Here all of them are merged into one .npz file per
+    station (time, speed, gust, direction), deduplicated by time, so the
+    record grows by a few rows per fetch. Queries interpolate the stations
+    onto the WHOPA site with the same barycentric weights as the wind map.
+    """
+
+    def __init__(self, path=WIND_HISTORY_DIR, retention=WIND_HISTORY_RETENTION):
+        self.path = path
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._stations = {}  # station_id -> {"lon", "lat", **columns}
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _file(self, station_id):
+        return os.path.join(self.path, f"{station_id}.npz")
+
+    def _load(self, station_id):
+        if station_id in self._stations:
+            return self._stations[station_id]
+        series = None
+        if self.path and os.path.exists(self._file(station_id)):
+            try:
+                with np.load(self._file(station_id)) as f:
+                    series = {name: f[name] for name in f.files}
+                series["lon"] = float(series["lon"])
+                series["lat"] = float(series["lat"])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"❌ Ignoring unreadable wind history of {station_id}: {e}")
+                series = None
+        self._stations[station_id] = series
+        return series
+
+    def _save(self, station_id, series):
+        if not self.path:
+            return
+        tmp_path = self._file(station_id) + ".tmp.npz"
+        try:
+            np.savez(tmp_path, **series)
+            os.replace(tmp_path, self._file(station_id))
+        except OSError as e:
+            print(f"❌ Could not write wind history of {station_id}: {e}")
+
+    def ingest(self, station_id, data):
+        """Merges the observations of one BoM station JSON. Returns the number of new rows."""
+        parsed = parse_observations(data)
+        if parsed is None:
+            return 0
+        lon, lat, columns = parsed
+
+        with self._lock:
+            series = self._load(station_id)
+            if series is not None:
+                new = ~np.isin(columns["time"], series["time"])
+                if not new.any():
+                    return 0
+                merged = {name: np.concatenate([series[name], columns[name][new]]) for name in COLUMNS}
+                order = np.argsort(merged["time"], kind="stable")
+                columns = {name: values[order] for name, values in merged.items()}
+                added = int(new.sum())
+            else:
+                added = len(columns["time"])
+
+            if self.retention:
+                keep = columns["time"] >= time.time() - self.retention
+                columns = {name: values[keep] for name, values in columns.items()}
+
+            series = dict(columns, lon=lon, lat=lat)
+            self._stations[station_id] = series
+            self._save(station_id, series)
+        return added
+
+    def ingest_all(self, results):
+        """Ingests BomStationClient.fetch_all() results, skipping stations without news."""
+        added = 0
+        for station_id, data, updated in results:
+            if updated and data is not None:
+                try:
+                    added += self.ingest(station_id, data)
+                except Exception as e:
+                    print(f"❌ Failed to store wind history of {station_id}: {e}")
+        return added
+
+    def station_series(self, station_id, start=None, end=None):
+        """Column arrays of one station between the unix times ``start`` and ``end``."""
+        with self._lock:
+            series = self._load(station_id)
+        if series is None:
+            return {name: np.array([]) for name in COLUMNS}
+        t = series["time"]
+        lo = 0 if start is None else np.searchsorted(t, start, side="left")
+        hi = len(t) if end is None else np.searchsorted(t, end, side="right")
+        return {name: series[name][lo:hi] for name in COLUMNS}
+
+    def site_history(self, hours=6, step=SITE_STEP, end=None, station_ids=STATION_IDS,
+                     lon=CENTER_LON, lat=CENTER_LAT):
+        """
+        Wind at (lon, lat) over the last ``hours`` on a regular ``step`` grid.
+
+        Every station series is resampled onto the grid (linear in time, NaN
+        across gaps longer than MAX_SAMPLE_GAP) and the stations are then
+        combined with barycentric weights, one weight set per distinct set of
+        reporting stations. Returns arrays time, speed, gust, u, v and
+        direction (deg, where the wind comes from) plus n_stations.
+        """
+        end = time.time() if end is None else end
+        grid = np.arange(end - hours * 3600, end + 1e-6, step)
+
+        positions, fields = [], []
+        for station_id in station_ids:
+            with self._lock:
+                series = self._load(station_id)
+            if series is None or not len(series["time"]):
+                continue
+            resampled = _resample(series, grid)
+            if resampled is not None:
+                positions.append((series["lon"], series["lat"]))
+                fields.append(resampled)
+
+        n = len(grid)
+        result = {"time": grid, "n_stations": np.zeros(n, dtype=int)}
+        result.update({name: np.full(n, np.nan) for name in ("speed", "gust", "u", "v", "direction")})
+        if not fields:
+            return result
+
+        positions = np.asarray(positions)
+        fields = np.stack(fields)  # (n_stations, 4, n_times): speed, gust, u, v
+        valid = np.isfinite(fields[:, 0, :])
+
+        # Stations come and go, but only a handful of distinct subsets occur
+        masks, inverse = np.unique(valid.T, axis=0, return_inverse=True)
+        site = np.full((4, n), np.nan)
+        for k, mask in enumerate(masks):
+            columns = np.nonzero(inverse.ravel() == k)[0]
+            if mask.sum() < 3:
+                continue
+            interp = get_station_interpolator(positions[mask])
+            values = fields[mask][:, :, columns].reshape(mask.sum(), -1)
+            site[:, columns] = interp(values, [[lon, lat]]).reshape(4, -1)
+            result["n_stations"][columns] = mask.sum()
+
+        result["speed"], result["gust"], result["u"], result["v"] = site
+        result["direction"] = np.rad2deg(np.arctan2(site[2], site[3])) % 360
+        return result
+
+    def site_trend(self, hours=3, **kwargs):
+        """
+        Summary of the site wind over the last ``hours``: latest and maximum
+        speed and gust, plus least-squares slopes in km/h per hour (positive
+        means the wind is picking up). Values are None without enough data.
+        """
+        history = self.site_history(hours=hours, **kwargs)
+        if not len(history["time"]):
+            return {"hours": hours, "speed": None, "gust": None, "max_speed": None, "max_gust": None,
+                    "speed_slope": None, "gust_slope": None}
+        hours_ago = (history["time"] - history["time"][-1]) / 3600
+
+        def latest(values):
+            finite = np.nonzero(np.isfinite(values))[0]
+            return float(values[finite[-1]]) if len(finite) else None
+
+        def slope(values):
+            ok = np.isfinite(values)
+            if ok.sum() < 3:
+                return None
+            return float(np.polyfit(hours_ago[ok], values[ok], 1)[0])
+
+        def maximum(values):
+            return float(np.nanmax(values)) if np.isfinite(values).any() else None
+
+        return {
+            "hours": hours,
+            "speed": latest(history["speed"]),
+            "gust": latest(history["gust"]),
+            "max_speed": maximum(history["speed"]),
+            "max_gust": maximum(history["gust"]),
+            "speed_slope": slope(history["speed"]),
+            "gust_slope": slope(history["gust"]),
+        }
+
+
+def _resample(series, grid):
+    """Station speed, gust, u and v on ``grid``, shape (4, len(grid)), or None if out of range."""
+    t = series["time"].astype(float)
+    if t[-1] < grid[0] - MAX_SAMPLE_GAP or t[0] > grid[-1] + MAX_SAMPLE_GAP:
+        return None
+
+    # NaN where the bracketing samples are too far apart, or (beyond either
+    # end) where the nearest sample is too old to hold on to
+    right = np.clip(np.searchsorted(t, grid), 1, len(t) - 1) if len(t) > 1 else np.zeros(len(grid), int)
+    left = np.maximum(right - 1, 0)
+    gap = np.where((grid >= t[left]) & (grid <= t[right]), t[right] - t[left],
+                   np.minimum(abs(grid - t[left]), abs(grid - t[right])))
+    bad = gap > MAX_SAMPLE_GAP
+
+    speed = series["speed"].astype(float)
+    direction = np.deg2rad(series["direction"].astype(float))
+    # Calm (no direction) contributes a zero vector
+    u = np.where(np.isfinite(direction), speed * np.sin(direction), 0.0)
+    v = np.where(np.isfinite(direction), speed * np.cos(direction), 0.0)
+
+    out = np.empty((4, len(grid)))
+    for i, values in enumerate((speed, series["gust"].astype(float), u, v)):
+        ok = np.isfinite(values)
+        if ok.sum() == 0:
+            out[i] = np.nan
+            continue
+        out[i] = np.interp(grid, t[ok], values[ok])
+    out[:, bad] = np.nan
+    return out
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_wind_history():
+    """The shared WindHistory."""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = WindHistory()
+        return _history
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.spatial import Delaunay, QhullError
+
+
+class StationInterpolator:
+    """
+    Linear interpolation from fixed station positions onto fixed query points.
+
+    The Delaunay triangulation of the stations and the barycentric weights of
+    every query point are computed once and stored as a sparse
+    (n_query, n_stations) matrix, so interpolating a field is a single
+    sparse matrix product. Several fields can be interpolated at once by
+    passing values of shape (n_stations, n_fields).
+    Query points outside the convex hull of the stations give NaN.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        try:
+            self.tri = Delaunay(self.points)
+        except (QhullError, ValueError):
+            self.tri = None  # fewer than 3 (non-collinear) stations
+        self._weights = {}
+        self._lock = threading.Lock()
+
+    def weights(self, xi):
+        """Returns (sparse weight matrix, outside mask) for query points ``xi`` of shape (n, 2)."""
+        xi = np.ascontiguousarray(xi, dtype=float).reshape(-1, 2)
+        key = (xi.shape, xi.tobytes())
+        with self._lock:
+            if key in self._weights:
+                return self._weights[key]
+
+        n_query, n_points = len(xi), len(self.points)
+        if self.tri is None:
+            result = csr_matrix((n_query, n_points)), np.ones(n_query, dtype=bool)
+        else:
+            simplex = self.tri.find_simplex(xi)
+            outside = simplex < 0
+            transform = self.tri.transform[simplex]
+            bary = np.einsum("nij,nj->ni", transform[:, :2], xi - transform[:, 2])
+            bary = np.column_stack([bary, 1 - bary.sum(axis=1)])
+            bary[outside] = 0
+            rows = np.repeat(np.arange(n_query), 3)
+            cols = self.tri.simplices[simplex].ravel()
+            result = csr_matrix((bary.ravel(), (rows, cols)), shape=(n_query, n_points)), outside
+
+        with self._lock:
+            self._weights[key] = result
+        return result
+
+    def __call__(self, values, xi):
+        """Interpolates ``values`` (n_stations,) or (n_stations, n_fields) onto ``xi``."""
+        weights, outside = self.weights(xi)
+        result = weights @ np.asarray(values, dtype=float)
+        result[outside] = np.nan
+        return result
+
+
+_interpolators = {}
+_interpolators_lock = threading.Lock()
+MAX_CACHED_INTERPOLATORS = 16
+
+
+def get_station_interpolator(points):
+    """
+    The StationInterpolator for this set of station positions. Stations only
+    drop in and out of the valid set occasionally, so the few triangulations
+    in use are kept around.
+    """
+    key = tuple(map(tuple, np.asarray(points, dtype=float).reshape(-1, 2)))
+    with _interpolators_lock:
+        interp = _interpolators.get(key)
+        if interp is None:
+            if len(_interpolators) >= MAX_CACHED_INTERPOLATORS:
+                _interpolators.pop(next(iter(_interpolators)))
+            interp = _interpolators[key] = StationInterpolator(points)
+        return interp
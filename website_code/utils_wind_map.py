@@ -0,0 +1,101 @@
+import hashlib
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
+import matplotlib.pyplot as plt
+
+from plot_wind_from_bom import plot_vic_wind_data_with_quivers, STATION_IDS
+from utils_bom_client import get_bom_client
+from utils_wind_history import get_wind_history
+
+WIND_MAP_CHECK_INTERVAL = 120  # seconds between checks for new BoM observations
+WIND_MAP_MAX_AGE = 1800  # re-render at least this often, so stale stations get greyed out
+
+
+def observation_key(station_data):
+    """The latest observation time of every station that answered."""
+    key = []
+    for station_id, data in station_data:
+        try:
+            key.append((station_id, data["observations"]["data"][0]["local_date_time_full"]))
+        except (TypeError, KeyError, IndexError):
+            continue
+    return tuple(sorted(key))
+
+
+class WindMapCache:
+    """
+    Keeps the rendered wind map PNG in memory.
+
+    A background thread checks BoM every WIND_MAP_CHECK_INTERVAL seconds,
+    adds new observations to the wind history and only re-renders when a
+    station reports a new observation (or the image is older than
+    WIND_MAP_MAX_AGE). Requests get the cached bytes together with an ETag
+    and Last-Modified date for conditional responses.
+    """
+
+    def __init__(self, check_interval=WIND_MAP_CHECK_INTERVAL, max_age=WIND_MAP_MAX_AGE):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._png = None
+        self._etag = None
+        self._last_modified = None
+        self._rendered_at = 0
+        self._key = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._cond = threading.Condition()
+        self._render_lock = threading.Lock()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="wind-map", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print("❌ Error refreshing wind map:", e)
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def refresh(self, force=False):
+        """Fetches the station data and re-renders if anything changed. Returns True if it did."""
+        with self._render_lock:
+            results = get_bom_client().fetch_all(STATION_IDS)
+            get_wind_history().ingest_all(results)
+            station_data = [(station_id, data) for station_id, data, _ in results]
+            key = observation_key(station_data)
+            expired = time.time() - self._rendered_at > self.max_age
+            if not force and not expired and key == self._key:
+                return False
+
+            fig = plot_vic_wind_data_with_quivers(return_fig=True, station_data=station_data)
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', bbox_inches='tight')
+            plt.close(fig)
+            png = buf.getvalue()
+
+            with self._cond:
+                self._png = png
+                self._etag = hashlib.sha1(png).hexdigest()
+                self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+                self._rendered_at = time.time()
+                self._key = key
+                self._cond.notify_all()
+            return True
+
+    def get(self, timeout=60):
+        """
+        Returns (png_bytes, etag, last_modified), waiting for the first render
+        if necessary. png_bytes is None if nothing could be rendered yet.
+        """
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._png is not None, timeout=timeout)
+            return self._png, self._etag, self._last_modified